@@ -15,6 +15,7 @@ from datetime import timedelta
 from pathlib import Path
 
 import sentry_sdk
+from boto3.s3.transfer import TransferConfig
 from sentry_sdk.integrations.django import DjangoIntegration
 import django_heroku
 import environ
@@ -210,6 +211,87 @@ else:
 SESSION_ENGINE = "django.contrib.sessions.backends.cache"
 SESSION_CACHE_ALIAS = "default"
 CELERY_BROKER_URL = os.environ.get("REDISCLOUD_URL", "redis://localhost:6379/0")
+CELERY_TASK_ALWAYS_EAGER = env.bool("CELERY_TASK_ALWAYS_EAGER", default = False)
+CELERY_TASK_EAGER_PROPAGATES = True
+CELERY_TASK_ACKS_LATE = True
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+# Download counters are buffered (in Redis when it backs the cache) and written to
+# the database every COUNTER_FLUSH_INTERVAL seconds by the flush-counters beat task.
+COUNTER_FLUSH_INTERVAL = 60
+# Flushed download and play counts are also summed per day in afkat_home.ActivityRollup,
+# which keeps ANALYTICS_RETENTION_DAYS of history for the stats and trending endpoints.
+ANALYTICS_RETENTION_DAYS = 400
+CELERY_BEAT_SCHEDULE = {
+    "purge-resumable-uploads": {
+        "task": "afkat.utils.tasks.purge_resumable_uploads",
+        "schedule": timedelta(hours = 1),
+    },
+    "purge-retired-builds": {
+        "task": "afkat_game.tasks.purge_retired_builds",
+        "schedule": timedelta(hours = 1),
+    },
+    "flush-counters": {
+        "task": "afkat.utils.tasks.flush_buffered_counters",
+        "schedule": timedelta(seconds = COUNTER_FLUSH_INTERVAL),
+    },
+    "purge-activity-rollups": {
+        "task": "afkat_home.tasks.purge_activity_rollups",
+        "schedule": timedelta(days = 1),
+    },
+}
+
+# When enabled, uploads are stored as-is and image compression (plus any other
+# media work) runs on the Celery worker instead of the request thread. Responsive
+# variants are only generated on the worker.
+MEDIA_PIPELINE_ASYNC = env.bool("MEDIA_PIPELINE_ASYNC", default = False)
+IMAGE_VARIANT_WIDTHS = (160, 320, 640, 1200)
+IMAGE_UPLOAD_MAX_SIZE_MB = 10
+# Compressed images are stored once per distinct content under IMAGE_STORE_LOCATION.
+IMAGE_DEDUPLICATION = env.bool("IMAGE_DEDUPLICATION", default = True)
+IMAGE_STORE_LOCATION = "images"
+IMAGE_UPLOAD_MAX_PIXELS = 80_000_000
+IMAGE_UPLOAD_MAX_FRAMES = 300
+# AVIF variants are only written when Pillow was built with AVIF support.
+IMAGE_VARIANT_FORMATS = ("AVIF", "WEBP", "JPEG")
+# Worker processes used by compress_images_batch (bulk uploads, recompression).
+IMAGE_BATCH_MAX_WORKERS = env.int("IMAGE_BATCH_MAX_WORKERS", default = 4)
+# Builds of archives on S3 run on the Celery worker; off, they run on the request
+# thread. Archives on a local filesystem storage are always built inline.
+WEBGL_BUILD_ASYNC = env.bool("WEBGL_BUILD_ASYNC", default = True)
+# Concurrent uploads used when extracting a WebGL build to storage.
+WEBGL_UPLOAD_MAX_WORKERS = env.int("WEBGL_UPLOAD_MAX_WORKERS", default = 8)
+# Build archives over these limits are rejected from their directory alone, before
+# anything is decompressed (see preflight_archive).
+WEBGL_ARCHIVE_MAX_FILES = env.int("WEBGL_ARCHIVE_MAX_FILES", default = 10_000)
+WEBGL_ARCHIVE_MAX_UNCOMPRESSED_MB = env.int("WEBGL_ARCHIVE_MAX_UNCOMPRESSED_MB", default = 4096)
+WEBGL_ARCHIVE_MAX_RATIO = env.int("WEBGL_ARCHIVE_MAX_RATIO", default = 100)
+# Most bytes of a 7z build held decompressed in memory while it is uploaded; files
+# larger than half of it are decompressed to FILE_UPLOAD_TEMP_DIR instead.
+WEBGL_7Z_BUFFER_BYTES = env.int("WEBGL_7Z_BUFFER_BYTES", default = 32 * 1024 * 1024)
+# Uncompressed build files are Brotli-compressed on ingest and served with
+# Content-Encoding: br; builds exported as .br/.gz are stored as they are.
+WEBGL_BROTLI = env.bool("WEBGL_BROTLI", default = True)
+WEBGL_BROTLI_QUALITY = 5
+# Build files are stored once per content under WEBGL_BLOB_LOCATION and each build
+# gets its own games/{id}/v{n}/ directory, so nothing is ever overwritten.
+WEBGL_BLOB_LOCATION = "blobs"
+WEBGL_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# How long a replaced build version (and unreferenced blobs) are kept for clients
+# that still have its index.html open before purge_retired_builds deletes them.
+WEBGL_BUILD_GRACE_PERIOD = timedelta(hours = env.int("WEBGL_BUILD_GRACE_HOURS", default = 24))
+# Lifetime in seconds of a direct-upload session for game and art files: both the
+# upload URL and the token that attaches the upload expire after it.
+DIRECT_UPLOAD_EXPIRES = 60 * 60
+# Resumable sessions last RESUMABLE_UPLOAD_EXPIRES and are S3 multipart uploads
+# of RESUMABLE_PART_SIZE parts. On a filesystem storage the chunks are assembled
+# in RESUMABLE_UPLOAD_DIR inside its location instead, which is only shared between instances if the media root is.
+RESUMABLE_UPLOAD_EXPIRES = 24 * 60 * 60
+RESUMABLE_PART_SIZE = 16 * 1024 * 1024
+RESUMABLE_UPLOAD_DIR = ".resumable"
+# Game and art downloads redirect to a presigned URL valid for DOWNLOAD_URL_EXPIRES
+# seconds; storages without one (and DOWNLOAD_REDIRECT=False) stream through the app.
+DOWNLOAD_REDIRECT = env.bool("DOWNLOAD_REDIRECT", default = True)
+DOWNLOAD_URL_EXPIRES = 5 * 60
 
 DEBUG_TOOLBAR_CONFIG = {
     "DISABLE_PANELS": [
@@ -326,11 +408,21 @@ AWS_S3_REGION_NAME = env("AWS_S3_REGION_NAME")
 AWS_S3_CUSTOM_DOMAIN = env("AWS_S3_CUSTOM_DOMAIN")
 
 AWS_S3_FILE_OVERWRITE = True
+# Point at an S3-compatible server (MinIO, LocalStack) for local development.
+AWS_S3_ENDPOINT_URL = env("AWS_S3_ENDPOINT_URL", default = None)
 AWS_DEFAULT_ACL = "public-read"
 AWS_S3_OBJECT_PARAMETERS = {
     "CacheControl": "max-age=86400",
 }
 
+# Each S3 upload buffers at most max_concurrency parts of multipart_chunksize;
+# WebGL builds already upload several files in parallel.
+AWS_S3_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold = 8 * 1024 * 1024,
+    multipart_chunksize = 8 * 1024 * 1024,
+    max_concurrency = 2,
+)
+
 AWS_S3_CUSTOM_DOMAIN_MIME_TYPES = {
     ".unityweb": "application/octet-stream",
     ".js": "application/javascript",
@@ -366,11 +458,18 @@ STORAGES = {
     "staticfiles": {
         "BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage",
     },
+    "webgl": {
+        "BACKEND": "afkat.storage_backends.WebGLBuildStorage",
+    },
 }
 
 WHITENOISE_MAX_AGE = 31536000
 WHITENOISE_KEEP_ONLY_HASHED_FILES = True
 
-DATA_UPLOAD_MAX_MEMORY_SIZE = 1 * 1024 * 1024 * 1024
-FILE_UPLOAD_MAX_MEMORY_SIZE = 1 * 1024 * 1024 * 1024
+# Uploaded files above FILE_UPLOAD_MAX_MEMORY_SIZE are spooled to FILE_UPLOAD_TEMP_DIR
+# instead of being held in RAM, so a 1 GB game build costs disk, not dyno memory.
+# DATA_UPLOAD_MAX_MEMORY_SIZE only covers the non-file part of a request body.
+DATA_UPLOAD_MAX_MEMORY_SIZE = env.int("DATA_UPLOAD_MAX_MEMORY_SIZE", default = 10 * 1024 * 1024)
+FILE_UPLOAD_MAX_MEMORY_SIZE = env.int("FILE_UPLOAD_MAX_MEMORY_SIZE", default = 5 * 1024 * 1024)
+FILE_UPLOAD_TEMP_DIR = env("FILE_UPLOAD_TEMP_DIR", default = None)
 django_heroku.settings(locals() , staticfiles = False )
@@ -1,5 +1,5 @@
 from django.conf import settings
-from storages.backends.s3boto3 import S3Boto3Storage
+from storages.backends.s3boto3 import S3Boto3Storage, S3StaticStorage
 
 
 class StaticStorage(S3Boto3Storage):
@@ -22,3 +22,17 @@ class MediaStorage(S3Boto3Storage):
     location = 'media'
     file_overwrite = False
     default_acl = 'public-read'
+
+
+class WebGLBuildStorage(S3StaticStorage):
+    """
+    Storage for extracted WebGL builds. Files may carry an ``object_parameters``
+    dict (Content-Type, Content-Encoding, Cache-Control) that is merged into
+    the S3 upload parameters.
+    """
+    accepts_object_parameters = True
+
+    def _get_write_parameters(self, name, content = None):
+        params = super()._get_write_parameters(name, content)
+        params.update(getattr(content, 'object_parameters', None) or {})
+        return params
@@ -23,6 +23,7 @@ from drf_yasg import openapi
 from drf_yasg.views import get_schema_view
 from rest_framework import permissions
 
+import afkat.views
 import afkat_home.views
 
 schema_view = get_schema_view(
@@ -48,6 +49,8 @@ urlpatterns = [
                       path('home/', include('afkat_home.api.urls')),
                       path('games/', include('afkat_game.api.urls')),
                       path('', include('afkat_art.api.urls')),
+                      path('media/<path:name>', afkat.views.media_redirect, name = 'media-redirect'),
+                      path('uploads/<str:token>/', afkat.views.direct_upload, name = 'direct-upload'),
                   ])),
 
               ] + static(settings.MEDIA_URL, document_root = settings.MEDIA_ROOT)
@@ -0,0 +1,187 @@
+# utils/counters.py
+import atexit
+import logging
+import threading
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.dispatch import Signal
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'counters'
+BATCH_SIZE = 500
+
+# Sent with sender=model, field and deltas={pk: delta} in the transaction that
+# writes the deltas, so receivers (afkat_home.analytics) commit or fail with it.
+counters_flushed = Signal()
+
+_local = {}
+_local_lock = threading.Lock()
+_last_local_flush = time.monotonic()
+
+
+def _redis():
+    """The django-redis connection behind the default cache, or None to buffer in process."""
+    if not settings.CACHES['default']['BACKEND'].startswith('django_redis.'):
+        return None
+    from django_redis import get_redis_connection
+
+    return get_redis_connection('default')
+
+
+def _key(model, field):
+    return f'{KEY_PREFIX}:{model._meta.label}:{field}'
+
+
+def _apply(model, field, deltas):
+    """Adds {pk: delta} to ``field`` with one UPDATE per BATCH_SIZE rows; returns the rows updated."""
+    deltas = {pk: delta for pk, delta in deltas.items() if delta}
+    pks = list(deltas)
+    updated = 0
+    with transaction.atomic():
+        for start in range(0, len(pks), BATCH_SIZE):
+            batch = pks[start:start + BATCH_SIZE]
+            delta = Case(
+                *[When(pk = pk, then = Value(deltas[pk])) for pk in batch],
+                default = Value(0),
+                output_field = IntegerField(),
+            )
+            updated += model.objects.filter(pk__in = batch).update(**{field: F(field) + delta})
+        if deltas:
+            counters_flushed.send(sender = model, field = field, deltas = deltas)
+    return updated
+
+
+def increment(model, pk, field = 'download_count', amount = 1):
+    """
+    Buffers ``amount`` for ``model.<field>`` of row ``pk`` instead of
+    updating the row: in a Redis hash per model field, shared by every web
+    process, when the default cache is django-redis, and in this process
+    otherwise. flush_counters writes the buffered deltas to the database;
+    a process buffer is only visible to its own process, so it is flushed
+    there, by increment() and at exit.
+    """
+    connection = _redis()
+    if connection is not None:
+        key = _key(model, field)
+        try:
+            with connection.pipeline() as pipe:
+                pipe.hincrby(key, pk, amount)
+                pipe.sadd(f'{KEY_PREFIX}:keys', key)
+                pipe.execute()
+            return
+        except Exception:
+            # Losing Redis must not lose the count; write it through instead,
+            # through _apply so the analytics rollups get it as well.
+            logger.warning("Buffering %s failed, updating %s directly", key, model._meta.label, exc_info = True)
+            _apply(model, field, {pk: amount})
+            return
+
+    global _last_local_flush
+    with _local_lock:
+        counts = _local.setdefault((model._meta.label, field), {})
+        counts[pk] = counts.get(pk, 0) + amount
+        due = time.monotonic() - _last_local_flush >= settings.COUNTER_FLUSH_INTERVAL
+    if due:
+        # No worker can see this process's buffer, so it flushes itself.
+        _flush_local()
+
+
+def pending_count(model, pk, field = 'download_count'):
+    """Increments of ``model.<field>`` for row ``pk`` not flushed to the database yet."""
+    connection = _redis()
+    if connection is None:
+        with _local_lock:
+            return _local.get((model._meta.label, field), {}).get(pk, 0)
+    key = _key(model, field)
+    try:
+        return sum(int(value or 0) for value in connection.hmget(key, pk) + connection.hmget(f'{key}:flushing', pk))
+    except Exception:
+        logger.warning("Reading buffered %s failed", key, exc_info = True)
+        return 0
+
+
+def pending_counts(model, pks, field = 'download_count'):
+    """
+    {pk: increments not flushed yet} of ``model.<field>`` for every row in
+    ``pks``, read from Redis in one round trip for a whole page of rows.
+    """
+    pks = list(pks)
+    connection = _redis()
+    if connection is None:
+        with _local_lock:
+            counts = _local.get((model._meta.label, field), {})
+            return {pk: counts.get(pk, 0) for pk in pks}
+    if not pks:
+        return {}
+    key = _key(model, field)
+    try:
+        with connection.pipeline(transaction = False) as pipe:
+            pipe.hmget(key, pks)
+            pipe.hmget(f'{key}:flushing', pks)
+            buffered, flushing = pipe.execute()
+    except Exception:
+        logger.warning("Reading buffered %s failed", key, exc_info = True)
+        return dict.fromkeys(pks, 0)
+    return {pk: int(new or 0) + int(old or 0) for pk, new, old in zip(pks, buffered, flushing)}
+
+
+def _flush_local():
+    global _local, _last_local_flush
+    with _local_lock:
+        buffered, _local = _local, {}
+        _last_local_flush = time.monotonic()
+    updated = 0
+    for (label, field), deltas in buffered.items():
+        updated += _apply(apps.get_model(label), field, deltas)
+    return updated
+
+
+@atexit.register
+def _flush_local_at_exit():
+    if not _local:
+        return
+    try:
+        _flush_local()
+    except Exception:
+        logger.exception("Flushing buffered counters at exit failed")
+
+
+def flush_counters():
+    """
+    Writes every buffered increment to the database; returns the rows updated.
+
+    Each Redis hash is renamed to ``<key>:flushing`` before it is read, so
+    increments arriving meanwhile start a new hash. A staging hash left by a
+    flush that died is applied on the next run before any rename, and a lock
+    keeps two flushes from applying the same deltas.
+    """
+    connection = _redis()
+    if connection is None:
+        return _flush_local()
+
+    lock = connection.lock(f'{KEY_PREFIX}:flush-lock', timeout = 10 * 60)
+    if not lock.acquire(blocking = False):
+        return 0
+    updated = 0
+    try:
+        for key in connection.smembers(f'{KEY_PREFIX}:keys'):
+            key = key.decode()
+            staging = f'{key}:flushing'
+            if not connection.exists(staging):
+                if not connection.exists(key):
+                    continue
+                connection.rename(key, staging)
+            _, label, field = key.split(':')
+            model = apps.get_model(label)
+            to_pk = model._meta.pk.to_python
+            deltas = {to_pk(pk.decode()): int(delta) for pk, delta in connection.hgetall(staging).items()}
+            updated += _apply(model, field, deltas)
+            connection.delete(staging)
+    finally:
+        lock.release()
+    return updated
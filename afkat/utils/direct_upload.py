@@ -0,0 +1,396 @@
+# utils/direct_upload.py
+import fcntl
+import hashlib
+import os
+import posixpath
+import time
+import uuid
+
+from django.apps import apps
+from django.conf import settings
+from django.core import signing
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.urls import reverse
+from django.utils.text import get_valid_filename
+from rest_framework import permissions, serializers, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import PermissionDenied
+from rest_framework.response import Response
+
+SALT = 'afkat.direct-upload'
+CHUNK_SIZE = 1024 * 1024
+# S3 multipart uploads have at most this many parts.
+MAX_PARTS = 10000
+
+
+class UploadedObject:
+    """Name and size of an object uploaded straight to storage, for the file validators."""
+
+    def __init__(self, name, size):
+        self.name = name
+        self.size = size
+
+
+def start_upload_session(instance, field_name, filename, size, validator, request = None, resumable = False):
+    """
+    Opens a direct upload of ``filename`` (``size`` bytes) for
+    ``instance.<field_name>``, checked up front with ``validator(None, file)``.
+
+    On S3 the client gets a presigned POST whose policy caps the object at the
+    declared size, so the bytes never pass through this app. Other storages
+    get a signed PUT URL served by afkat.views.direct_upload.
+
+    The upload URL and the token expire together, after DIRECT_UPLOAD_EXPIRES
+    or, for a ``resumable`` session, RESUMABLE_UPLOAD_EXPIRES. On S3 a
+    resumable session is a multipart upload: ``upload.parts`` holds a
+    presigned PUT URL per ``upload.part_size`` bytes, and a HEAD of
+    ``upload.url`` reports how far the parts received so far reach
+    (Upload-Offset), read back from S3 with ListParts, so any app instance
+    can answer it. On a filesystem storage the
+    file is sent in PATCH chunks to ``upload.url`` instead (see append_chunk).
+    Returns {token, key, expires_in, upload: {method, url, fields}}; the
+    token is handed back to attach_upload once the upload is done.
+    """
+    validator(None, UploadedObject(filename, size))
+
+    field = instance._meta.get_field(field_name)
+    storage = field.storage
+    upload_to = field.upload_to if isinstance(field.upload_to, str) else ''
+    key = posixpath.join(upload_to, uuid.uuid4().hex, get_valid_filename(posixpath.basename(filename)))
+    expires = settings.RESUMABLE_UPLOAD_EXPIRES if resumable else settings.DIRECT_UPLOAD_EXPIRES
+    session = {
+        'model': instance._meta.label, 'pk': instance.pk, 'field': field_name, 'key': key, 'size': size,
+        'resumable': resumable, 'expires': int(time.time()) + expires,
+    }
+    if resumable and hasattr(storage, 'bucket_name'):
+        session['part_size'] = max(settings.RESUMABLE_PART_SIZE, -(-size // MAX_PARTS))
+        session['upload_id'] = storage.connection.meta.client.create_multipart_upload(
+            Bucket = storage.bucket_name,
+            Key = storage._normalize_name(key),
+            **({'ACL': storage.default_acl} if storage.default_acl else {}),
+        )['UploadId']
+    elif resumable and not isinstance(storage, FileSystemStorage):
+        raise serializers.ValidationError({'error': 'Resumable uploads are not supported by this storage'})
+    token = signing.dumps(session, salt = SALT)
+
+    if resumable:
+        url = reverse('direct-upload', kwargs = {'token': token})
+        url = request.build_absolute_uri(url) if request else url
+        if 'upload_id' in session:
+            upload = {
+                'method': 'PUT', 'url': url, 'fields': {}, 'part_size': session['part_size'],
+                'parts': _part_urls(session, storage, expires),
+            }
+        else:
+            upload = {'method': 'PATCH', 'url': url, 'fields': {}}
+    elif hasattr(storage, 'bucket_name'):
+        fields = {'acl': storage.default_acl} if storage.default_acl else {}
+        conditions = [['content-length-range', 1, size]] + [{name: value} for name, value in fields.items()]
+        post = storage.connection.meta.client.generate_presigned_post(
+            storage.bucket_name,
+            storage._normalize_name(key),
+            Fields = fields,
+            Conditions = conditions,
+            ExpiresIn = expires,
+        )
+        upload = {'method': 'POST', 'url': post['url'], 'fields': post['fields']}
+    else:
+        url = reverse('direct-upload', kwargs = {'token': token})
+        upload = {'method': 'PUT', 'url': request.build_absolute_uri(url) if request else url, 'fields': {}}
+
+    return {'token': token, 'key': key, 'expires_in': expires, 'upload': upload}
+
+
+def _part_urls(session, storage, expires):
+    """Presigned PUT URL of every part of a multipart session, in part order."""
+    client = storage.connection.meta.client
+    return [
+        client.generate_presigned_url(
+            'upload_part',
+            Params = {
+                'Bucket': storage.bucket_name,
+                'Key': storage._normalize_name(session['key']),
+                'UploadId': session['upload_id'],
+                'PartNumber': number,
+            },
+            ExpiresIn = expires,
+        )
+        for number in range(1, -(-session['size'] // session['part_size']) + 1)
+    ]
+
+
+def _received_parts(session, storage):
+    """The parts of a multipart session S3 holds from part 1 on without a gap: [{PartNumber, ETag, Size}]."""
+    client = storage.connection.meta.client
+    params = {
+        'Bucket': storage.bucket_name, 'Key': storage._normalize_name(session['key']), 'UploadId': session['upload_id'],
+    }
+    parts = []
+    while True:
+        page = client.list_parts(**params)
+        parts += page.get('Parts', [])
+        if not page.get('IsTruncated'):
+            break
+        params['PartNumberMarker'] = page['NextPartNumberMarker']
+    received = []
+    for part in sorted(parts, key = lambda part: part['PartNumber']):
+        if part['PartNumber'] != len(received) + 1:
+            break
+        received.append(part)
+    return received
+
+
+def load_session(token):
+    """Returns the session data signed into ``token``; raises signing.BadSignature."""
+    session = signing.loads(token, salt = SALT)
+    if session['expires'] < time.time():
+        raise signing.SignatureExpired('Upload session expired')
+    return session
+
+
+def session_storage(session):
+    return apps.get_model(session['model'])._meta.get_field(session['field']).storage
+
+
+def _staging_dir(storage):
+    return os.path.join(storage.location, settings.RESUMABLE_UPLOAD_DIR)
+
+
+def staging_path(session):
+    """
+    Where the chunks of a filesystem resumable session are assembled: inside
+    the storage's own location, so every instance that can serve the storage
+    can resume the upload, and finishing it is a rename.
+    """
+    digest = hashlib.sha256(session['key'].encode()).hexdigest()
+    return os.path.join(_staging_dir(session_storage(session)), f'{digest}.part')
+
+
+def upload_offset(session):
+    """Bytes of a resumable session received so far."""
+    if 'upload_id' in session:
+        storage = session_storage(session)
+        try:
+            return sum(part['Size'] for part in _received_parts(session, storage))
+        except storage.connection.meta.client.exceptions.NoSuchUpload:
+            # Completed (or aborted) uploads have no parts left to list.
+            return storage.size(session['key']) if storage.exists(session['key']) else 0
+    try:
+        return os.path.getsize(staging_path(session))
+    except FileNotFoundError:
+        return 0
+
+
+class OffsetMismatch(Exception):
+    def __init__(self, offset):
+        super().__init__(f'Upload is at offset {offset}')
+        self.offset = offset
+
+
+def append_chunk(session, offset, stream, length):
+    """
+    Appends ``length`` bytes read from ``stream`` to a resumable session that
+    has received exactly ``offset`` bytes, raising OffsetMismatch otherwise.
+    The chunk is streamed to disk; if the connection drops midway, whatever
+    arrived is kept and the client resumes from the offset it reads back.
+    The file is locked while a chunk is written, so a second request for
+    the same offset gets OffsetMismatch instead of appending too. Returns
+    the new offset.
+    """
+    path = staging_path(session)
+    os.makedirs(os.path.dirname(path), exist_ok = True)
+    with open(path, 'ab') as staged:
+        try:
+            fcntl.flock(staged, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise OffsetMismatch(os.fstat(staged.fileno()).st_size)
+        staged.seek(0, os.SEEK_END)
+        if staged.tell() != offset:
+            raise OffsetMismatch(staged.tell())
+        remaining = length
+        while remaining:
+            chunk = stream.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            staged.write(chunk)
+            remaining -= len(chunk)
+        return staged.tell()
+
+
+def _incomplete(received, session):
+    return serializers.ValidationError(
+        {'error': f'Upload has not been completed ({received} of {session["size"]} bytes received)'}
+    )
+
+
+def _store_staged(session, storage):
+    """
+    Finishes a resumable upload in place, without copying it: S3 assembles
+    the multipart upload from the parts it holds, and a filesystem staging
+    file is renamed to its key.
+    """
+    key = session['key']
+    if 'upload_id' in session:
+        client = storage.connection.meta.client
+        try:
+            parts = _received_parts(session, storage)
+        except client.exceptions.NoSuchUpload:
+            # Already completed by an earlier finalize.
+            return
+        received = sum(part['Size'] for part in parts)
+        if received != session['size']:
+            raise _incomplete(received, session)
+        client.complete_multipart_upload(
+            Bucket = storage.bucket_name,
+            Key = storage._normalize_name(key),
+            UploadId = session['upload_id'],
+            MultipartUpload = {'Parts': [{'PartNumber': part['PartNumber'], 'ETag': part['ETag']} for part in parts]},
+        )
+        return
+
+    received = upload_offset(session)
+    if received != session['size']:
+        if storage.exists(key):
+            return
+        raise _incomplete(received, session)
+    path = storage.path(key)
+    os.makedirs(os.path.dirname(path), exist_ok = True)
+    os.replace(staging_path(session), path)
+    if storage.file_permissions_mode is not None:
+        os.chmod(path, storage.file_permissions_mode)
+
+
+def purge_stale_uploads(max_age = None, storage = None):
+    """
+    Drops resumable uploads started more than ``max_age`` seconds ago
+    (default RESUMABLE_UPLOAD_EXPIRES) that were never finished: S3 multipart
+    uploads are aborted, staged files deleted. Returns how many.
+    """
+    storage = storage or default_storage
+    max_age = settings.RESUMABLE_UPLOAD_EXPIRES if max_age is None else max_age
+    cutoff = time.time() - max_age
+    purged = 0
+    if hasattr(storage, 'bucket_name'):
+        client = storage.connection.meta.client
+        for page in client.get_paginator('list_multipart_uploads').paginate(
+            Bucket = storage.bucket_name, Prefix = storage._normalize_name(''),
+        ):
+            for upload in page.get('Uploads', []):
+                if upload['Initiated'].timestamp() < cutoff:
+                    client.abort_multipart_upload(
+                        Bucket = storage.bucket_name, Key = upload['Key'], UploadId = upload['UploadId'],
+                    )
+                    purged += 1
+        return purged
+    if not isinstance(storage, FileSystemStorage):
+        return 0
+    try:
+        entries = list(os.scandir(_staging_dir(storage)))
+    except FileNotFoundError:
+        return 0
+    for entry in entries:
+        if entry.name.endswith('.part') and entry.stat().st_mtime < cutoff:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                continue
+            purged += 1
+    return purged
+
+
+def attach_upload(instance, token, validator):
+    """
+    Attaches the object uploaded for ``token`` to ``instance`` once it exists
+    in storage and passes ``validator``; a rejected object is deleted.
+    Returns the name of the field that now points at it.
+    """
+    try:
+        session = load_session(token)
+    except signing.BadSignature:
+        raise serializers.ValidationError({'error': 'Invalid or expired upload token'})
+    if session['model'] != instance._meta.label or session['pk'] != instance.pk:
+        raise serializers.ValidationError({'error': 'Upload token belongs to another object'})
+
+    storage = session_storage(session)
+    key = session['key']
+    if session.get('resumable'):
+        _store_staged(session, storage)
+    if not storage.exists(key):
+        raise serializers.ValidationError({'error': 'Upload has not been completed'})
+
+    size = storage.size(key)
+    try:
+        if size > session['size']:
+            raise serializers.ValidationError({'error': 'Uploaded file is larger than declared'})
+        validator(None, UploadedObject(key, size))
+    except serializers.ValidationError:
+        storage.delete(key)
+        raise
+
+    type(instance).objects.filter(pk = instance.pk).update(**{session['field']: key})
+    instance.refresh_from_db()
+    return session['field']
+
+
+class DirectUploadMixin:
+    """
+    ViewSet actions for uploads that bypass the app servers:
+
+        POST {id}/upload-session/           {"field", "filename", "size", "resumable"}
+        POST {id}/upload-session/finalize/  {"token"}
+
+    ``direct_upload_fields`` maps each uploadable field to its validator and
+    ``owner_field`` names the user allowed to upload. ``upload_finalized`` is
+    called after a file has been attached.
+    """
+    direct_upload_fields = {}
+    owner_field = 'creator'
+
+    def get_upload_target(self, request):
+        instance = self.get_object()
+        if getattr(instance, self.owner_field) != request.user:
+            raise PermissionDenied("Only the owner can upload files.")
+        return instance
+
+    @action(detail = True, methods = ['post'], url_path = 'upload-session',
+            permission_classes = [permissions.IsAuthenticated])
+    def upload_session(self, request, pk = None):
+        instance = self.get_upload_target(request)
+        field_name = request.data.get('field')
+        if field_name not in self.direct_upload_fields:
+            raise serializers.ValidationError(
+                {'error': f'field must be one of: {", ".join(self.direct_upload_fields)}'}
+            )
+        try:
+            size = int(request.data.get('size'))
+        except (TypeError, ValueError):
+            raise serializers.ValidationError({'error': 'size is required'})
+        if size <= 0:
+            raise serializers.ValidationError({'error': 'size is required'})
+
+        resumable = str(request.data.get('resumable', '')).lower() in ('1', 'true')
+        session = start_upload_session(
+            instance, field_name, request.data.get('filename') or '', size,
+            self.direct_upload_fields[field_name], request, resumable,
+        )
+        return Response(session, status = status.HTTP_201_CREATED)
+
+    @action(detail = True, methods = ['post'], url_path = 'upload-session/finalize',
+            permission_classes = [permissions.IsAuthenticated])
+    def finalize_upload(self, request, pk = None):
+        instance = self.get_upload_target(request)
+        token = request.data.get('token') or ''
+        try:
+            field_name = load_session(token)['field']
+        except signing.BadSignature:
+            raise serializers.ValidationError({'error': 'Invalid or expired upload token'})
+        if field_name not in self.direct_upload_fields:
+            raise serializers.ValidationError({'error': 'Upload token belongs to another object'})
+
+        attach_upload(instance, token, self.direct_upload_fields[field_name])
+        self.upload_finalized(instance, field_name)
+        instance.refresh_from_db()
+        return Response(self.get_serializer(instance).data)
+
+    def upload_finalized(self, instance, field_name):
+        pass
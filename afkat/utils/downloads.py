@@ -0,0 +1,230 @@
+# utils/downloads.py
+import mimetypes
+import posixpath
+import re
+import sys
+import uuid
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseRedirect, StreamingHttpResponse
+from django.utils.cache import patch_cache_control
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe
+
+CHUNK_SIZE = 1024 * 1024
+# Requests asking for more ranges than this get the whole file instead.
+MAX_RANGES = 16
+
+_RANGE_SPEC = re.compile(r'^(\d*)-(\d*)$')
+
+
+def parse_range(header, size):
+    """
+    Byte ranges [(first, last)] that a Range ``header`` asks for in a file of
+    ``size`` bytes, sorted, with overlapping or adjacent ranges merged.
+
+    Returns None when the header is to be ignored and the whole file served
+    (no header, another unit, a malformed spec or more than MAX_RANGES
+    ranges) and [] when none of the ranges is satisfiable.
+    """
+    if not header:
+        return None
+    unit, _, specs = header.partition('=')
+    if unit.strip().lower() != 'bytes':
+        return None
+
+    ranges = []
+    for spec in specs.split(','):
+        match = _RANGE_SPEC.match(spec.strip())
+        if not match or not any(match.groups()):
+            return None
+        first, last = match.groups()
+        if not first:
+            suffix = int(last)
+            if not suffix or not size:
+                continue
+            ranges.append((max(size - suffix, 0), size - 1))
+            continue
+        first = int(first)
+        if last and int(last) < first:
+            return None
+        if first < size:
+            ranges.append((first, min(int(last), size - 1) if last else size - 1))
+
+    merged = []
+    for first, last in sorted(ranges):
+        if merged and first <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], last))
+        else:
+            merged.append((first, last))
+    return None if len(merged) > MAX_RANGES else merged
+
+
+def _if_range_matches(header, etag, modified):
+    """Whether an If-Range ``header`` still describes the file; weak ETags never match."""
+    if header is None:
+        return True
+    if header.startswith(('"', 'W/')):
+        return header == etag
+    timestamp = parse_http_date_safe(header)
+    return timestamp is not None and timestamp == int(modified.timestamp())
+
+
+def _is_new_download(request, ranges):
+    """A GET for the whole file or for a range from byte 0 starts a download; other ranges resume one."""
+    return request.method == 'GET' and (ranges is None or bool(ranges) and ranges[0][0] == 0)
+
+
+def read_range(field_file, first, last):
+    """
+    Yields bytes ``first`` to ``last`` (inclusive) of ``field_file``. S3 is
+    asked for just that range, other storages are seeked into, so nothing
+    outside it is read.
+    """
+    if last < first:
+        return
+    storage = field_file.storage
+    if hasattr(storage, 'bucket_name'):
+        body = storage.connection.meta.client.get_object(
+            Bucket = storage.bucket_name,
+            Key = storage._normalize_name(field_file.name),
+            Range = f'bytes={first}-{last}',
+        )['Body']
+        try:
+            yield from body.iter_chunks(CHUNK_SIZE)
+        finally:
+            body.close()
+        return
+
+    with storage.open(field_file.name, 'rb') as source:
+        source.seek(first)
+        remaining = last - first + 1
+        while remaining:
+            chunk = source.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def _multipart_ranges(field_file, parts, closing):
+    for header, first, last in parts:
+        yield header
+        yield from read_range(field_file, first, last)
+        yield b'\r\n'
+    yield closing
+
+
+def serve_file(request, field_file, filename):
+    """
+    Streams ``field_file`` as an attachment, honouring Range and If-Range:
+    a 200 for the whole file, a 206 for one range or several as
+    multipart/byteranges, a 416 when no range is satisfiable. The ETag is
+    derived from the size and modification time, so it changes whenever
+    the file is replaced.
+    """
+    storage = field_file.storage
+    size = storage.size(field_file.name)
+    modified = storage.get_modified_time(field_file.name)
+    etag = f'"{size:x}-{int(modified.timestamp() * 1000000):x}"'
+    content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+    ranges = parse_range(request.headers.get('Range'), size)
+    if ranges is not None and not _if_range_matches(request.headers.get('If-Range'), etag, modified):
+        ranges = None
+
+    if ranges is None:
+        if hasattr(storage, 'bucket_name'):
+            response = StreamingHttpResponse(read_range(field_file, 0, size - 1), content_type = content_type)
+            response['Content-Length'] = size
+        else:
+            response = FileResponse(field_file.open('rb'), content_type = content_type)
+    elif not ranges:
+        response = HttpResponse(status = 416)
+        response['Content-Range'] = f'bytes */{size}'
+    elif len(ranges) == 1:
+        first, last = ranges[0]
+        response = StreamingHttpResponse(read_range(field_file, first, last), status = 206, content_type = content_type)
+        response['Content-Range'] = f'bytes {first}-{last}/{size}'
+        response['Content-Length'] = last - first + 1
+    else:
+        boundary = uuid.uuid4().hex
+        parts = [
+            (
+                f'--{boundary}\r\nContent-Type: {content_type}\r\nContent-Range: bytes {first}-{last}/{size}\r\n\r\n'
+                .encode(),
+                first,
+                last,
+            )
+            for first, last in ranges
+        ]
+        closing = f'--{boundary}--\r\n'.encode()
+        response = StreamingHttpResponse(
+            _multipart_ranges(field_file, parts, closing),
+            status = 206,
+            content_type = f'multipart/byteranges; boundary={boundary}',
+        )
+        response['Content-Length'] = (
+            sum(len(header) + last - first + 1 + 2 for header, first, last in parts) + len(closing)
+        )
+
+    if response.status_code != 416:
+        response['Content-Disposition'] = content_disposition_header(True, filename)
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(modified.timestamp())
+    response.new_download = _is_new_download(request, ranges)
+    return response
+
+
+def download_url(field_file, filename):
+    """
+    Short-lived URL that serves ``field_file`` as an attachment named
+    ``filename``, or None when its storage can only be read through the app.
+
+    S3 gets a presigned GET whose response-content-disposition makes the
+    browser save the object under ``filename``. Behind a CloudFront domain
+    with a signer configured the URL is a signed CDN URL instead, carrying
+    the same parameter for the origin.
+    """
+    storage = field_file.storage
+    if not settings.DOWNLOAD_REDIRECT or not hasattr(storage, 'bucket_name'):
+        return None
+
+    disposition = content_disposition_header(True, filename)
+    expires = settings.DOWNLOAD_URL_EXPIRES
+    if storage.custom_domain and storage.cloudfront_signer:
+        return storage.url(field_file.name, parameters = {'response-content-disposition': disposition}, expire = expires)
+    return storage.connection.meta.client.generate_presigned_url(
+        'get_object',
+        Params = {
+            'Bucket': storage.bucket_name,
+            'Key': storage._normalize_name(field_file.name),
+            'ResponseContentDisposition': disposition,
+        },
+        ExpiresIn = expires,
+    )
+
+
+def download_response(request, field_file, filename = None):
+    """
+    Responds with ``field_file`` as a download: a 302 to download_url when
+    the storage supports one, so the bytes never pass through a worker, and
+    serve_file otherwise. ``response.new_download`` tells whether the
+    request starts a download rather than resuming one, so a download
+    fetched in several ranges is counted once.
+    """
+    if not field_file:
+        raise Http404('No file to download')
+    filename = filename or posixpath.basename(field_file.name)
+
+    url = download_url(field_file, filename)
+    if url is None:
+        return serve_file(request, field_file, filename)
+
+    response = HttpResponseRedirect(url)
+    # The URL expires, so the redirect must not outlive it in a cache.
+    patch_cache_control(response, private = True, no_store = True)
+    # Clients that resume through this URL send their Range along; the size
+    # is unknown here, so only the start of the first range is looked at.
+    response.new_download = _is_new_download(request, parse_range(request.headers.get('Range'), sys.maxsize))
+    return response
@@ -0,0 +1,88 @@
+# utils/image_batch.py
+import io
+import itertools
+import multiprocessing
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from django.conf import settings
+from django.core.files.uploadedfile import InMemoryUploadedFile
+
+from .image_compression import compress_image
+
+
+def compress_images_batch(files, ordered = True, max_workers = None, return_exceptions = False, **options):
+    """
+    Runs compress_image over many files in a bounded pool of worker processes,
+    so the Pillow work of a bulk upload is spread across cores.
+
+    Args:
+        files: Iterable of uploaded files (anything with read() and name)
+        ordered: If True, return a list of results in input order. If False,
+            return a generator yielding (index, result) as each file finishes
+        max_workers: Worker processes, defaults to IMAGE_BATCH_MAX_WORKERS
+            (capped at the CPU count)
+        return_exceptions: If True, a file that fails yields its exception
+            instead of aborting the whole batch
+        **options: Passed through to compress_image
+
+    Files are read in the parent and sent to the workers as bytes; at most two
+    per worker are in flight at once, so memory stays bounded however long the
+    batch is. Inside a daemonic process (a Celery prefork worker), which may not
+    start children, or with max_workers=1, the batch runs in-process.
+    """
+    max_workers = max_workers or min(settings.IMAGE_BATCH_MAX_WORKERS, os.cpu_count() or 1)
+    results = _compress_stream(files, max_workers, return_exceptions, options)
+    if not ordered:
+        return results
+    collected = dict(results)
+    return [collected[index] for index in range(len(collected))]
+
+
+def _compress_stream(files, max_workers, return_exceptions, options):
+    jobs = ((index, _read(image_file), image_file.name) for index, image_file in enumerate(files))
+
+    if max_workers <= 1 or multiprocessing.current_process().daemon:
+        for index, data, name in jobs:
+            yield index, _result(_compress_bytes, (data, name, options), return_exceptions)
+        return
+
+    # Workers only need Pillow, so spawn them rather than fork a threaded server.
+    executor = ProcessPoolExecutor(max_workers, mp_context = multiprocessing.get_context('spawn'))
+    try:
+        pending = {}
+        for index, data, name in itertools.islice(jobs, max_workers * 2):
+            pending[executor.submit(_compress_bytes, data, name, options)] = index
+        while pending:
+            done, _ = wait(pending, return_when = FIRST_COMPLETED)
+            for future in done:
+                index = pending.pop(future)
+                for next_index, data, name in itertools.islice(jobs, 1):
+                    pending[executor.submit(_compress_bytes, data, name, options)] = next_index
+                yield index, _result(future.result, (), return_exceptions)
+    finally:
+        # A consumer that stops iterating early should not wait on the rest.
+        executor.shutdown(cancel_futures = True)
+
+
+def _read(image_file):
+    if hasattr(image_file, 'seek'):
+        image_file.seek(0)
+    return image_file.read()
+
+
+def _result(call, args, return_exceptions):
+    try:
+        name, content_type, data = call(*args)
+    except Exception as exc:
+        if not return_exceptions:
+            raise
+        return exc
+    return InMemoryUploadedFile(io.BytesIO(data), 'ImageField', name, content_type, len(data), None)
+
+
+def _compress_bytes(data, name, options):
+    source = io.BytesIO(data)
+    source.name = name
+    compressed = compress_image(source, **options)
+    return compressed.name, compressed.content_type, compressed.read()
@@ -0,0 +1,235 @@
+"""
+Benchmarks compress_image on a reproducible synthetic corpus, using the
+compression settings of the serializers that accept image uploads.
+
+    python -m afkat.utils.image_benchmark [--runs 3] [--max-size 8k] [--output results.json]
+    python -m afkat.utils.image_benchmark --compare-decode [--size 8000]
+
+The corpus is drawn by Pillow (gradients and Mandelbrot detail, no randomness)
+and covers JPEG/PNG/WebP, RGBA and palette modes, sizes from thumbnails to 8K
+and an animated GIF. Every measurement runs in a fresh process and reports wall
+time, peak RSS (VmHWM, reset through /proc/self/clear_refs, falling back to
+ru_maxrss off Linux), output bytes and the number of encodes. The JSON written
+with --output is meant to be diffed between releases.
+"""
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import time
+from unittest import mock
+
+import PIL
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image
+
+from afkat.utils.image_compression import compress_image
+
+# (serializer, field) pairs whose CompressedImageField options are benchmarked.
+SERIALIZER_FIELDS = [
+    ('afkat_home.api.serializers.PostSerializer', 'image'),
+    ('afkat_game.api.serializers.GameDetailSerializer', 'thumbnail'),
+    ('afkat_art.api.serializers.ArtSerializer', 'thumbnail'),
+    ('afkat_auth.serializers.ProfileSerializer', 'profile_image'),
+]
+
+SIZES = {
+    'small': (640, 480),
+    '2k': (2048, 1536),
+    '4k': (3840, 2160),
+    '8k': (7680, 4320),
+}
+
+# (label, format, mode, size) for each still image in the corpus.
+CORPUS = [
+    ('jpeg-rgb-small', 'JPEG', 'RGB', 'small'),
+    ('jpeg-rgb-2k', 'JPEG', 'RGB', '2k'),
+    ('jpeg-rgb-4k', 'JPEG', 'RGB', '4k'),
+    ('jpeg-rgb-8k', 'JPEG', 'RGB', '8k'),
+    ('png-rgb-2k', 'PNG', 'RGB', '2k'),
+    ('png-rgba-2k', 'PNG', 'RGBA', '2k'),
+    ('png-p-small', 'PNG', 'P', 'small'),
+    ('png-rgba-4k', 'PNG', 'RGBA', '4k'),
+    ('webp-rgb-2k', 'WEBP', 'RGB', '2k'),
+    ('webp-rgba-2k', 'WEBP', 'RGBA', '2k'),
+]
+
+EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'WEBP': 'webp', 'GIF': 'gif'}
+
+
+def synthetic_image(size, mode = 'RGB'):
+    gradient = Image.radial_gradient('L').resize(size)
+    detail = Image.effect_mandelbrot(size, (-2.0, -1.2, 1.0, 1.2), 100)
+    img = Image.merge('RGB', (gradient, detail, Image.linear_gradient('L').resize(size)))
+    if mode == 'RGBA':
+        img.putalpha(gradient.transpose(Image.FLIP_LEFT_RIGHT))
+    elif mode == 'P':
+        img = img.quantize(64)
+    return img
+
+
+def synthetic_photo(size, format = 'JPEG'):
+    output = io.BytesIO()
+    synthetic_image((size, size)).save(output, format = format, quality = 90)
+    return output.getvalue()
+
+
+def synthetic_animation(size = (800, 600), frames = 12):
+    base = synthetic_image(size)
+    sequence = [base.rotate(angle * 30).quantize(128) for angle in range(frames)]
+    output = io.BytesIO()
+    sequence[0].save(output, format = 'GIF', save_all = True, append_images = sequence[1:], duration = 80, loop = 0)
+    return output.getvalue()
+
+
+def build_corpus(max_size = '8k'):
+    """Returns [(label, filename, bytes)], skipping images larger than ``max_size``."""
+    allowed = list(SIZES)[:list(SIZES).index(max_size) + 1]
+    corpus = []
+    for label, img_format, mode, size in CORPUS:
+        if size not in allowed:
+            continue
+        output = io.BytesIO()
+        synthetic_image(SIZES[size], mode).save(output, format = img_format, quality = 90)
+        corpus.append((label, f"{label}.{EXTENSIONS[img_format]}", output.getvalue()))
+    corpus.append(('gif-animated', 'gif-animated.gif', synthetic_animation()))
+    return corpus
+
+
+def serializer_configs():
+    """
+    Returns [(labels, options)] with the compress_image options of
+    SERIALIZER_FIELDS; serializers that share options are measured once.
+    """
+    import django
+    from django.utils.module_loading import import_string
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'afkat.settings')
+    django.setup()
+
+    configs = {}
+    for serializer_path, field_name in SERIALIZER_FIELDS:
+        field = import_string(serializer_path)().fields[field_name]
+        options = field.compression_options
+        label = f"{serializer_path.rsplit('.', 1)[1]}.{field_name}"
+        configs.setdefault(json.dumps(options, sort_keys = True), (options, []))[1].append(label)
+    return [(labels, options) for options, labels in configs.values()]
+
+
+def _peak_rss_kb():
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _reset_peak_rss():
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+    except OSError:
+        pass
+
+
+def _measure(args):
+    name, data, options = args
+    _reset_peak_rss()
+    baseline_kb = _peak_rss_kb()
+    with mock.patch.object(Image.Image, 'save', autospec = True, side_effect = Image.Image.save) as save:
+        start = time.perf_counter()
+        result = compress_image(SimpleUploadedFile(name, data), **options)
+        elapsed = time.perf_counter() - start
+    peak_kb = _peak_rss_kb()
+    return {
+        'ms': round(elapsed * 1000, 2),
+        'peak_rss_mb': round((peak_kb - baseline_kb) / 1024, 2),
+        'output_bytes': result.size,
+        'output_name': result.name,
+        'encodes': save.call_count,
+    }
+
+
+def run_corpus(runs = 3, max_size = '8k'):
+    context = multiprocessing.get_context('spawn')
+    results = []
+    configs = serializer_configs()
+    with context.Pool(1, maxtasksperchild = 1) as pool:
+        for label, name, data in build_corpus(max_size):
+            for serializers, options in configs:
+                samples = [pool.apply(_measure, ((name, data, options),)) for _ in range(runs)]
+                results.append({
+                    'image': label,
+                    'input_bytes': len(data),
+                    'serializers': serializers,
+                    'options': options,
+                    'ms': min(sample['ms'] for sample in samples),
+                    'peak_rss_mb': max(sample['peak_rss_mb'] for sample in samples),
+                    'output_bytes': samples[0]['output_bytes'],
+                    'output_name': samples[0]['output_name'],
+                    'encodes': samples[0]['encodes'],
+                })
+    return {
+        'python': platform.python_version(),
+        'pillow': PIL.__version__,
+        'runs': runs,
+        'results': results,
+    }
+
+
+def run(size, runs):
+    data = synthetic_photo(size)
+    context = multiprocessing.get_context('spawn')
+    results = {}
+    for label, reduced_decode in (('full decode', False), ('reduced decode', True)):
+        options = {'max_size': 1200, 'quality': 80, 'max_file_size_kb': 500, 'reduced_decode': reduced_decode}
+        with context.Pool(1, maxtasksperchild = 1) as pool:
+            samples = [pool.apply(_measure, (('photo.jpg', data, options),)) for _ in range(runs)]
+        results[label] = (
+            min(sample['ms'] for sample in samples),
+            max(sample['peak_rss_mb'] for sample in samples),
+        )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.split('\n\n')[0])
+    parser.add_argument('--runs', type = int, default = 3)
+    parser.add_argument('--max-size', choices = list(SIZES), default = '8k')
+    parser.add_argument('--output', help = 'Write the corpus results as JSON to this path ("-" for stdout)')
+    parser.add_argument('--compare-decode', action = 'store_true',
+                        help = 'Compare the full and reduced decode paths on one large JPEG instead')
+    parser.add_argument('--size', type = int, default = 8000, help = 'Edge of the --compare-decode JPEG')
+    args = parser.parse_args()
+
+    if args.compare_decode:
+        print(f"{args.size}x{args.size} JPEG -> max_size 1200, {args.runs} run(s) each")
+        for label, (elapsed_ms, peak_mb) in run(args.size, args.runs).items():
+            print(f"{label:>15}: {elapsed_ms:8.1f} ms  peak RSS +{peak_mb:7.1f} MB")
+        return
+
+    report = run_corpus(args.runs, args.max_size)
+    if args.output == '-':
+        json.dump(report, sys.stdout, indent = 2)
+        return
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent = 2)
+
+    for result in report['results']:
+        print(
+            f"{result['image']:>15} {result['input_bytes'] / 1024:9.0f} KB -> {result['output_bytes'] / 1024:7.0f} KB"
+            f"  {result['ms']:8.1f} ms  peak +{result['peak_rss_mb']:7.1f} MB  {result['encodes']} encode(s)"
+            f"  [{', '.join(result['serializers'])}]"
+        )
+
+
+if __name__ == '__main__':
+    main()
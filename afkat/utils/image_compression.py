@@ -1,13 +1,21 @@
 # utils/image_compression.py
 from PIL import Image
 import io
-import sys
+import math
 from django.core.files.uploadedfile import InMemoryUploadedFile
 import magic
 
 
+ENCODINGS = {
+    'JPEG': ('image/jpeg', 'jpg'),
+    'PNG': ('image/png', 'png'),
+    'WEBP': ('image/webp', 'webp'),
+}
+
+
 def compress_image(image_file, max_size = 1200, quality = 80, format = None,
-                   maintain_format = True, max_file_size_kb = None):
+                   maintain_format = True, max_file_size_kb = None, min_quality = 20, max_encodes = 4,
+                   reduced_decode = True):
     """
     Compresses an image while maintaining aspect ratio.
 
@@ -17,7 +25,11 @@ def compress_image(image_file, max_size = 1200, quality = 80, format = None,
         quality: JPEG/WebP compression quality (1-100)
         format: Output format ('JPEG', 'PNG', 'WebP', etc.) or None to auto-detect
         maintain_format: If True, try to keep original format unless size constraints require JPEG
-        max_file_size_kb: Target maximum file size in KB (approximate)
+        max_file_size_kb: Target maximum file size in KB, met by binary-searching the quality
+        min_quality: Lowest quality the size search may go down to
+        max_encodes: Upper bound on extra encodes spent meeting max_file_size_kb
+        reduced_decode: If True, decode large images close to max_size (JPEG draft mode,
+            Image.reduce otherwise) instead of at full resolution
 
     Returns:
         Compressed InMemoryUploadedFile object
@@ -28,10 +40,16 @@ def compress_image(image_file, max_size = 1200, quality = 80, format = None,
     img = Image.open(image_file)
 
     original_format = img.format if maintain_format else None
+    if reduced_decode:
+        img = _decode_reduced(img, max_size)
     img_format = format or original_format or 'JPEG'
 
-    if img_format.upper() == 'JPG':
+    img_format = img_format.upper()
+    if img_format == 'JPG':
+        img_format = 'JPEG'
+    if img_format not in ENCODINGS:
         img_format = 'JPEG'
+    mime_type, file_ext = ENCODINGS[img_format]
 
     if img_format == 'JPEG' and img.mode in ('RGBA', 'LA', 'P'):
         background = Image.new('RGB', img.size, (255, 255, 255))
@@ -51,34 +69,12 @@ def compress_image(image_file, max_size = 1200, quality = 80, format = None,
             new_width = int(width * (max_size / height))
         img = img.resize((new_width, new_height), Image.LANCZOS)
 
-    output = io.BytesIO()
+    output = _encode(img, img_format, quality)
 
-    if img_format == 'JPEG':
-        mime_type = 'image/jpeg'
-        file_ext = 'jpg'
-        img.save(output, format = img_format, quality = quality, optimize = True)
-    elif img_format == 'PNG':
-        mime_type = 'image/png'
-        file_ext = 'png'
-        img.save(output, format = img_format, optimize = True)
-    elif img_format == 'WEBP':
-        mime_type = 'image/webp'
-        file_ext = 'webp'
-        img.save(output, format = img_format, quality = quality)
-    else:
-        mime_type = 'image/jpeg'
-        file_ext = 'jpg'
-        img.save(output, format = 'JPEG', quality = quality, optimize = True)
-
-    if max_file_size_kb and img_format in ['JPEG', 'WEBP']:
-        current_size = sys.getsizeof(output) / 1024
-        current_quality = quality
-
-        while current_size > max_file_size_kb and current_quality > 20:
-            output = io.BytesIO()
-            current_quality -= 5
-            img.save(output, format = img_format, quality = current_quality, optimize = True)
-            current_size = sys.getsizeof(output) / 1024
+    if max_file_size_kb and img_format in ('JPEG', 'WEBP'):
+        budget = int(max_file_size_kb * 1024)
+        if output.getbuffer().nbytes > budget:
+            output = _encode_within_budget(img, img_format, quality, budget, min_quality, max_encodes) or output
 
     output.seek(0)
 
@@ -94,6 +90,62 @@ def compress_image(image_file, max_size = 1200, quality = 80, format = None,
         'ImageField',
         new_filename,
         mime_type,
-        sys.getsizeof(output),
+        output.getbuffer().nbytes,
         None
-    )
\ No newline at end of file
+    )
+
+
+def _decode_reduced(img, max_size, reducing_gap = 2.0):
+    """
+    Decodes ``img`` at roughly ``reducing_gap`` times the final size. JPEGs are
+    scaled inside the decoder (draft mode), so the full-resolution bitmap is
+    never allocated; other formats are shrunk with a cheap box reduce() before
+    the LANCZOS resize.
+    """
+    width, height = img.size
+    scale = max(width, height) / max_size
+    if scale < reducing_gap:
+        return img
+
+    if img.format == 'JPEG':
+        img.draft(img.mode, (math.ceil(width / scale * reducing_gap), math.ceil(height / scale * reducing_gap)))
+
+    img.load()
+    factor = int(max(img.size) / max_size / reducing_gap)
+    if factor > 1 and img.mode not in ('1', 'P'):
+        img = img.reduce(factor)
+    return img
+
+
+def _encode(img, img_format, quality):
+    output = io.BytesIO()
+    if img_format == 'JPEG':
+        img.save(output, format = img_format, quality = quality, optimize = True)
+    elif img_format == 'WEBP':
+        img.save(output, format = img_format, quality = quality)
+    else:
+        img.save(output, format = img_format, optimize = True)
+    return output
+
+
+def _encode_within_budget(img, img_format, quality, budget, min_quality, max_encodes):
+    """
+    Binary-searches the highest quality in [min_quality, quality) whose encoded
+    size fits ``budget`` bytes, using at most ``max_encodes`` extra encodes.
+    Falls back to the smallest attempt if nothing fits, or None if the quality
+    range is empty.
+    """
+    low, high = min_quality, quality - 1
+    best = smallest = None
+    for _ in range(max_encodes):
+        if low > high:
+            break
+        mid = (low + high) // 2
+        output = _encode(img, img_format, mid)
+        if output.getbuffer().nbytes <= budget:
+            best = output
+            low = mid + 1
+        else:
+            smallest = output
+            high = mid - 1
+    return best or smallest
\ No newline at end of file
@@ -0,0 +1,81 @@
+# utils/image_preflight.py
+from dataclasses import dataclass
+import warnings
+
+from django.conf import settings
+from PIL import Image
+from rest_framework import serializers
+import magic
+
+FORMAT_MIME_TYPES = {
+    'JPEG': 'image/jpeg',
+    'PNG': 'image/png',
+    'WEBP': 'image/webp',
+    'GIF': 'image/gif',
+}
+
+
+@dataclass(frozen = True)
+class ImageInfo:
+    format: str
+    width: int
+    height: int
+    frames: int
+
+
+def preflight_image(image_file, max_size_mb = None, max_pixels = None, max_frames = None):
+    """
+    Checks an upload using only its header, before any pixel data is decoded.
+
+    Args:
+        image_file: Django uploaded file object
+        max_size_mb: Largest accepted upload (defaults to IMAGE_UPLOAD_MAX_SIZE_MB)
+        max_pixels: Largest accepted width * height (defaults to IMAGE_UPLOAD_MAX_PIXELS)
+        max_frames: Most frames accepted in animated images (defaults to IMAGE_UPLOAD_MAX_FRAMES)
+
+    Returns:
+        ImageInfo read from the header
+
+    Raises:
+        serializers.ValidationError if the file is too large, is not one of the
+        supported formats, its libmagic type disagrees with its header, or its
+        dimensions / frame count look like a decompression bomb.
+    """
+    max_size_mb = max_size_mb or settings.IMAGE_UPLOAD_MAX_SIZE_MB
+    max_pixels = max_pixels or settings.IMAGE_UPLOAD_MAX_PIXELS
+    max_frames = max_frames or settings.IMAGE_UPLOAD_MAX_FRAMES
+
+    if image_file.size > max_size_mb * 1024 * 1024:
+        raise serializers.ValidationError({'error': f'Image too large, maximum size is {max_size_mb} MB'})
+
+    image_file.seek(0)
+    mime_type = magic.from_buffer(image_file.read(2048), mime = True)
+    image_file.seek(0)
+
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', Image.DecompressionBombWarning)
+            img = Image.open(image_file)
+        frames = getattr(img, 'n_frames', 1)
+    except (Image.DecompressionBombWarning, Image.DecompressionBombError):
+        raise serializers.ValidationError({'error': 'Image dimensions are too large'})
+    except Exception:
+        raise serializers.ValidationError({'error': 'Upload a valid image'})
+    finally:
+        image_file.seek(0)
+
+    expected_mime_type = FORMAT_MIME_TYPES.get(img.format)
+    if expected_mime_type is None:
+        raise serializers.ValidationError(
+            {'error': f'Unsupported image format. Use: {", ".join(FORMAT_MIME_TYPES)}'}
+        )
+    if mime_type != expected_mime_type:
+        raise serializers.ValidationError({'error': 'Image content does not match its format'})
+
+    width, height = img.size
+    if width * height > max_pixels:
+        raise serializers.ValidationError({'error': 'Image dimensions are too large'})
+    if frames > max_frames:
+        raise serializers.ValidationError({'error': 'Animated image has too many frames'})
+
+    return ImageInfo(img.format, width, height, frames)
@@ -0,0 +1,94 @@
+# utils/image_store.py
+import hashlib
+import posixpath
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+
+from .image_variants import variant_names
+
+# Every ImageField that may point into the content-addressed store.
+IMAGE_FIELDS = (
+    ('afkat_home.Post', 'image'),
+    ('afkat_auth.Profile', 'profile_image'),
+    ('afkat_game.Game', 'thumbnail'),
+    ('afkat_game.GameJam', 'game_jam_thumbnail'),
+    ('afkat_art.ArtModel', 'thumbnail'),
+)
+
+
+def is_content_addressed(name):
+    return bool(name) and name.startswith(f"{settings.IMAGE_STORE_LOCATION}/")
+
+
+def content_name(content, file_ext):
+    digest = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    digest = digest.hexdigest()
+    return f"{settings.IMAGE_STORE_LOCATION}/{digest[:2]}/{digest}.{file_ext}"
+
+
+def store_image(content, storage = default_storage):
+    """
+    Stores compressed image bytes under a key derived from their SHA-256 and
+    returns that key. Identical images, whichever model they were uploaded
+    to, end up pointing at the same object and are only uploaded once.
+    """
+    file_ext = posixpath.splitext(content.name)[1].lstrip('.').lower() or 'jpg'
+    name = content_name(content, file_ext)
+    if not storage.exists(name):
+        name = storage.save(name, content)
+    return name
+
+
+def reference_count(name):
+    return sum(
+        apps.get_model(model_label).objects.filter(**{field_name: name}).count()
+        for model_label, field_name in IMAGE_FIELDS
+    )
+
+
+def variants_cache_key(name):
+    return f"image-variants:{hashlib.md5(name.encode()).hexdigest()}"
+
+
+def variants_for(name):
+    """
+    Returns the {format: {width: name}} variants stored for image ``name``,
+    cached because the redirect endpoint needs them on every image request.
+    """
+    key = variants_cache_key(name)
+    variants = cache.get(key)
+    if variants is None:
+        variants = {}
+        for model_label, field_name in IMAGE_FIELDS:
+            model = apps.get_model(model_label)
+            variants_field = f"{field_name}_variants"
+            if not hasattr(model, variants_field):
+                continue
+            found = model.objects.filter(**{field_name: name}).values_list(variants_field, flat = True).first()
+            if found:
+                variants = found
+                break
+        cache.set(key, variants, 60 * 60)
+    return variants
+
+
+def discard_image(storage, name, variants = None):
+    """
+    Deletes an image that is no longer needed, together with its variants.
+    Content-addressed images are only deleted once no row references them.
+    """
+    if not name:
+        return
+    if is_content_addressed(name) and reference_count(name):
+        return
+    storage.delete(name)
+    for variant in variant_names(variants):
+        storage.delete(variant)
+    cache.delete(variants_cache_key(name))
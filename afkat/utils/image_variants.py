@@ -0,0 +1,131 @@
+# utils/image_variants.py
+import io
+import posixpath
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image
+
+VARIANT_FORMATS = {
+    'AVIF': ('avif', {'quality': 60}),
+    'WEBP': ('webp', {'quality': 80, 'method': 4}),
+    'JPEG': ('jpg', {'quality': 80, 'optimize': True, 'progressive': True}),
+}
+
+MIME_TYPES = {
+    'avif': 'image/avif',
+    'webp': 'image/webp',
+    'jpeg': 'image/jpeg',
+}
+
+
+def supported_formats(formats):
+    """Drops formats this Pillow build cannot encode (AVIF needs Pillow 11.2+ with libavif)."""
+    Image.init()
+    return tuple(img_format for img_format in formats if img_format in Image.SAVE)
+
+
+def preferred_format(accept, available):
+    """
+    Picks the best of ``available`` variant formats ('avif', 'webp', 'jpeg')
+    that the client's Accept header allows, in that order of preference.
+    Returns None when none of them is acceptable.
+    """
+    accepted = {}
+    for item in accept.split(','):
+        media_type, *params = [part.strip() for part in item.split(';')]
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[media_type.lower()] = quality
+
+    for img_format in MIME_TYPES:
+        if img_format not in available:
+            continue
+        mime_type = MIME_TYPES[img_format]
+        quality = accepted.get(mime_type)
+        if quality is None and img_format == 'jpeg':
+            # Every image client takes JPEG; only an explicit q=0 rules it out.
+            quality = accepted.get('image/*', accepted.get('*/*', 1.0))
+        if quality:
+            return img_format
+    return None
+
+
+def variant_name(name, width, file_ext):
+    stem, _ = posixpath.splitext(name)
+    return f"{stem}_{width}w.{file_ext}"
+
+
+def generate_variants(field_file, widths = None, formats = None, reuse_existing = False):
+    """
+    Writes resized copies of a stored image next to the original.
+
+    Args:
+        field_file: FieldFile of an already stored image
+        widths: Target widths in pixels (defaults to IMAGE_VARIANT_WIDTHS)
+        formats: Output formats (defaults to IMAGE_VARIANT_FORMATS)
+        reuse_existing: Keep variants that already exist instead of re-encoding them;
+            only safe when the name identifies the content
+
+    Returns:
+        {format: {width: name}} map of the stored variants, e.g.
+        {'webp': {'160': 'games/thumbnails/x_160w.webp', ...}, 'jpeg': {...}}.
+        Widths larger than the source are clamped to the source width, so the
+        biggest variant is never an upscale.
+    """
+    widths = widths or settings.IMAGE_VARIANT_WIDTHS
+    formats = supported_formats(formats or settings.IMAGE_VARIANT_FORMATS)
+    storage = field_file.storage
+
+    with field_file.open('rb') as source:
+        img = Image.open(source)
+        targets = sorted({min(width, img.width) for width in widths}, reverse = True)
+        names = {
+            (img_format, width): variant_name(field_file.name, width, VARIANT_FORMATS[img_format][0])
+            for width in targets
+            for img_format in formats
+        }
+        if reuse_existing and all(storage.exists(name) for name in names.values()):
+            return _variant_map(names)
+        img.load()
+
+    if img.mode not in ('RGB', 'RGBA'):
+        img = img.convert('RGBA' if 'transparency' in img.info else 'RGB')
+
+    current = img
+    for width in targets:
+        height = max(1, round(img.height * width / img.width))
+        # Downscale from the previous (larger) step instead of the original.
+        current = current.resize((width, height), Image.LANCZOS) if current.width != width else current
+        for img_format in formats:
+            name = names[img_format, width]
+            if storage.exists(name):
+                if reuse_existing:
+                    continue
+                storage.delete(name)
+            frame = current
+            if img_format == 'JPEG' and frame.mode == 'RGBA':
+                frame = Image.new('RGB', frame.size, (255, 255, 255))
+                frame.paste(current, mask = current.split()[3])
+            output = io.BytesIO()
+            frame.save(output, format = img_format, **VARIANT_FORMATS[img_format][1])
+            names[img_format, width] = storage.save(name, ContentFile(output.getvalue()))
+
+    return _variant_map(names)
+
+
+def _variant_map(names):
+    variants = {}
+    for (img_format, width), name in names.items():
+        variants.setdefault(img_format.lower(), {})[str(width)] = name
+    return variants
+
+
+def variant_names(variants):
+    return {name for names in (variants or {}).values() for name in names.values()}
@@ -0,0 +1,67 @@
+# utils/media_pipeline.py
+from django.conf import settings
+from django.db import transaction
+
+
+def enqueue(task, *args):
+    """
+    Hands a media task to the Celery worker once the current transaction commits.
+
+    With MEDIA_PIPELINE_ASYNC off the task simply runs inline, which is also how
+    the test suite exercises the pipeline.
+    """
+    if not settings.MEDIA_PIPELINE_ASYNC:
+        return task(*args)
+    transaction.on_commit(lambda: task.delay(*args))
+
+
+def variants_field_name(field_name):
+    return f"{field_name}_variants"
+
+
+def has_variants_field(instance, field_name):
+    return hasattr(instance, variants_field_name(field_name))
+
+
+def process_image_field(instance, field_name, options = None):
+    """
+    Schedules post-upload work for the file currently stored on
+    ``instance.<field_name>``: compression of the raw upload when ``options``
+    are given, then responsive variants when the model keeps them.
+
+    Variants cost an encode per IMAGE_VARIANT_WIDTHS and IMAGE_VARIANT_FORMATS
+    pair, so they are only made on the worker; with MEDIA_PIPELINE_ASYNC off
+    the request thread just compresses, and the image is served as stored.
+    """
+    from .tasks import process_uploaded_image
+
+    field_file = getattr(instance, field_name)
+    variants = settings.MEDIA_PIPELINE_ASYNC and has_variants_field(instance, field_name)
+    if not field_file or (options is None and not variants):
+        return
+    enqueue(
+        process_uploaded_image,
+        instance._meta.label,
+        instance.pk,
+        field_name,
+        field_file.name,
+        options,
+        variants,
+    )
+
+
+def swap_field_file(instance, field_name, old_name, new_name):
+    """
+    Points ``instance.<field_name>`` at ``new_name`` if it still references
+    ``old_name`` and deletes whichever file lost. Returns True on success.
+    """
+    from .image_store import discard_image
+
+    model = type(instance)
+    storage = getattr(instance, field_name).storage
+    updated = model.objects.filter(pk = instance.pk, **{field_name: old_name}).update(
+        **{field_name: new_name}
+    )
+    if old_name != new_name:
+        discard_image(storage, old_name if updated else new_name)
+    return bool(updated)
@@ -1,5 +1,12 @@
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.urls import reverse
 from rest_framework import serializers
+from .counters import pending_count, pending_counts
 from .image_compression import compress_image
+from .image_preflight import preflight_image
+from .image_store import discard_image, is_content_addressed, store_image
+from .media_pipeline import process_image_field, variants_field_name
 
 
 class CompressedImageField(serializers.ImageField):
@@ -10,15 +17,154 @@ class CompressedImageField(serializers.ImageField):
         self.format = kwargs.pop('format', None)
         self.maintain_format = kwargs.pop('maintain_format', True)
         self.max_file_size_kb = kwargs.pop('max_file_size_kb', None)
+        self.deferred = kwargs.pop('deferred', None)
+        self.max_upload_size_mb = kwargs.pop('max_upload_size_mb', None)
         super().__init__(*args, **kwargs)
 
+    @property
+    def compression_options(self):
+        return {
+            'max_size': self.max_size,
+            'quality': self.quality,
+            'format': self.format,
+            'maintain_format': self.maintain_format,
+            'max_file_size_kb': self.max_file_size_kb,
+        }
+
+    @property
+    def is_deferred(self):
+        if self.deferred is None:
+            return settings.MEDIA_PIPELINE_ASYNC
+        return self.deferred
+
     def to_internal_value(self, data):
+        if hasattr(data, 'read') and hasattr(data, 'size'):
+            # Header-only checks run before ImageField reads and verifies the upload.
+            preflight_image(data, max_size_mb = self.max_upload_size_mb)
         file = super().to_internal_value(data)
-        return compress_image(
-            file,
-            max_size = self.max_size,
-            quality = self.quality,
-            format = self.format,
-            maintain_format = self.maintain_format,
-            max_file_size_kb = self.max_file_size_kb
-        )
\ No newline at end of file
+        if self.is_deferred:
+            # Stored as uploaded; the media pipeline compresses it after save.
+            return file
+        return compress_image(file, **self.compression_options)
+
+
+def pending_image_fields(serializer, validated_data):
+    """
+    Returns (source, options) for every CompressedImageField upload in
+    validated_data that still needs pipeline work after save. ``options`` is
+    None when the image was already compressed on the request thread.
+    """
+    return [
+        (field.source, field.compression_options if field.is_deferred else None)
+        for field in serializer.fields.values()
+        if isinstance(field, CompressedImageField) and validated_data.get(field.source)
+    ]
+
+
+def store_pending_images(pending, validated_data, instance = None):
+    """
+    Swaps already-compressed uploads in validated_data for their
+    content-addressed names and returns the (name, variants) they replace.
+    """
+    replaced = {}
+    for source, options in pending:
+        if instance is not None:
+            replaced[source] = (
+                getattr(instance, source).name,
+                getattr(instance, variants_field_name(source), None),
+            )
+        if options is None and settings.IMAGE_DEDUPLICATION:
+            validated_data[source] = store_image(validated_data[source])
+    return replaced
+
+
+def process_pending_images(instance, pending, replaced):
+    """Runs the media pipeline for saved uploads and releases the images they replaced."""
+    for source, options in pending:
+        process_image_field(instance, source, options)
+        old_name, old_variants = replaced.get(source, (None, None))
+        field_file = getattr(instance, source)
+        if is_content_addressed(old_name) and old_name != field_file.name:
+            discard_image(field_file.storage, old_name, old_variants)
+
+
+class ImageVariantsField(serializers.Field):
+    """Read-only {format: {width: url}} map of an image's stored variants."""
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        return {
+            img_format: {width: default_storage.url(name) for width, name in names.items()}
+            for img_format, names in (value or {}).items()
+        }
+
+
+class NegotiatedImageField(serializers.Field):
+    """
+    Read-only URL of the media redirect endpoint for an image, so an <img src>
+    gets the best variant for the browser's Accept header.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        url = reverse('media-redirect', kwargs = {'name': value.name})
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+
+class BufferedCountField(serializers.ReadOnlyField):
+    """
+    Read-only counter such as download_count, including increments not
+    flushed yet (see counters). Under a BufferedCountListSerializer they are
+    read for the whole page at once; a single object reads its own.
+    """
+
+    def get_attribute(self, instance):
+        counts = self.context.get('pending_counts', {}).get(self.source)
+        if counts is not None and instance.pk in counts:
+            pending = counts[instance.pk]
+        else:
+            pending = pending_count(type(instance), instance.pk, self.source)
+        return super().get_attribute(instance) + pending
+
+
+class BufferedCountListSerializer(serializers.ListSerializer):
+    """
+    ListSerializer that reads the unflushed increments of every
+    BufferedCountField on its child with one pending_counts() per field,
+    instead of a Redis round trip per field and row.
+    """
+
+    def to_representation(self, data):
+        rows = list(data.all() if hasattr(data, 'all') else data)
+        if rows:
+            model = type(rows[0])
+            pks = [row.pk for row in rows]
+            self.context['pending_counts'] = {
+                field.source: pending_counts(model, pks, field.source)
+                for field in self.child.fields.values() if isinstance(field, BufferedCountField)
+            }
+        return super().to_representation(rows)
+
+
+class MediaPipelineMixin:
+    """
+    Serializer mixin that hands CompressedImageField uploads to the media
+    pipeline once the instance has been saved (deduplication, deferred
+    compression and responsive variants).
+    """
+
+    def save(self, **kwargs):
+        pending = pending_image_fields(self, self.validated_data)
+        replaced = store_pending_images(pending, self.validated_data, self.instance)
+        instance = super().save(**kwargs)
+        process_pending_images(instance, pending, replaced)
+        return instance
@@ -0,0 +1,72 @@
+# utils/tasks.py
+from celery import shared_task
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+
+from .counters import flush_counters
+from .direct_upload import purge_stale_uploads
+from .image_compression import compress_image
+from .image_store import is_content_addressed, store_image, variants_cache_key
+from .image_variants import generate_variants, variant_names
+from .media_pipeline import has_variants_field, swap_field_file, variants_field_name
+
+
+@shared_task(ignore_result = True)
+def process_uploaded_image(model_label, pk, field_name, name, options = None, variants = True):
+    model = apps.get_model(model_label)
+    instance = model.objects.filter(pk = pk).first()
+    if instance is None:
+        return
+
+    field_file = getattr(instance, field_name)
+    if field_file.name != name:
+        # A newer upload replaced this one while it sat in the queue.
+        return
+
+    if options is not None:
+        with field_file.open('rb') as raw:
+            compressed = compress_image(raw, **options)
+            if settings.IMAGE_DEDUPLICATION:
+                new_name = store_image(compressed, field_file.storage)
+            else:
+                new_name = field_file.field.generate_filename(instance, compressed.name)
+                new_name = field_file.storage.save(new_name, compressed)
+
+        if not swap_field_file(instance, field_name, name, new_name):
+            return
+        name = new_name
+        instance.refresh_from_db(fields = [field_name])
+        field_file = getattr(instance, field_name)
+
+    if variants and has_variants_field(instance, field_name):
+        store_variants(instance, field_name, field_file, name)
+
+
+def store_variants(instance, field_name, field_file, name):
+    variants_field = variants_field_name(field_name)
+    old_names = variant_names(getattr(instance, variants_field))
+    shared = is_content_addressed(name)
+    variants = generate_variants(field_file, reuse_existing = shared)
+    new_names = variant_names(variants)
+
+    updated = type(instance).objects.filter(pk = instance.pk, **{field_name: name}).update(
+        **{variants_field: variants}
+    )
+    if updated:
+        cache.set(variants_cache_key(name), variants, 60 * 60)
+    stale_names = old_names - new_names if updated else new_names - old_names
+    for stale in stale_names:
+        # Variants of shared images go away with the image itself (discard_image).
+        if not is_content_addressed(stale):
+            field_file.storage.delete(stale)
+
+
+@shared_task(ignore_result = True)
+def purge_resumable_uploads():
+    purge_stale_uploads()
+
+
+@shared_task(ignore_result = True)
+def flush_buffered_counters():
+    flush_counters()
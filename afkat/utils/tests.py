@@ -0,0 +1,466 @@
+import fcntl
+import io
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.http import FileResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image
+from rest_framework.exceptions import ValidationError
+from botocore.stub import Stubber
+from storages.backends.s3boto3 import S3StaticStorage
+
+from afkat.utils import counters, image_compression
+from afkat.utils.counters import flush_counters, increment, pending_count
+from afkat.utils.direct_upload import OffsetMismatch, _store_staged, append_chunk, staging_path, upload_offset
+from afkat.utils.downloads import download_response
+from afkat.utils.image_batch import compress_images_batch
+from afkat.utils.image_compression import compress_image
+from afkat.utils.image_preflight import preflight_image
+from afkat.utils.image_variants import preferred_format, supported_formats
+from afkat.utils.media_pipeline import process_image_field
+from afkat.utils.serializer_field import CompressedImageField
+from afkat.utils.tasks import process_uploaded_image
+from afkat_art.api.serializers import ArtSerializer
+from afkat_art.models import ArtModel
+
+User = get_user_model()
+
+MEDIA_ROOT = tempfile.mkdtemp()
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+TEST_STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+}
+
+
+def make_image(name='test.png', size=(2000, 1000), format='PNG', mode='RGB'):
+    buffer = io.BytesIO()
+    Image.new('RGB', (1, 1), (120, 30, 200)).convert(mode).resize(size).save(buffer, format=format)
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type=f'image/{format.lower()}')
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, STORAGES=TEST_STORAGES)
+class MediaPipelineTests(TestCase):
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='StrongPassword123!'
+        )
+
+    def test_deferred_field_returns_raw_upload(self):
+        field = CompressedImageField(max_size=100, deferred=True)
+        upload = make_image()
+
+        value = field.to_internal_value(upload)
+
+        self.assertIs(value, upload)
+
+    def test_pipeline_swaps_in_compressed_image(self):
+        art = ArtModel.objects.create(
+            title='Test Art',
+            author=self.user,
+            thumbnail=make_image(),
+            model_file=SimpleUploadedFile('model.glb', b'glb'),
+        )
+        raw_name = art.thumbnail.name
+
+        process_image_field(art, 'thumbnail', {'max_size': 100, 'format': 'JPEG', 'maintain_format': False})
+
+        art.refresh_from_db()
+        self.assertNotEqual(art.thumbnail.name, raw_name)
+        self.assertTrue(art.thumbnail.name.endswith('.jpg'))
+        self.assertFalse(art.thumbnail.storage.exists(raw_name))
+        with Image.open(art.thumbnail.path) as img:
+            self.assertEqual(img.size, (100, 50))
+
+    def test_pipeline_stores_responsive_variants(self):
+        art = ArtModel.objects.create(
+            title='Test Art',
+            author=self.user,
+            thumbnail=make_image(size=(700, 350)),
+            model_file=SimpleUploadedFile('model.glb', b'glb'),
+        )
+
+        process_uploaded_image(art._meta.label, art.pk, 'thumbnail', art.thumbnail.name)
+
+        art.refresh_from_db()
+        expected = {img_format.lower() for img_format in supported_formats(settings.IMAGE_VARIANT_FORMATS)}
+        self.assertEqual(set(art.thumbnail_variants), expected)
+        self.assertEqual(list(art.thumbnail_variants['webp']), ['700', '640', '320', '160'])
+        with art.thumbnail.storage.open(art.thumbnail_variants['jpeg']['160']) as variant:
+            self.assertEqual(Image.open(variant).size, (160, 80))
+
+    def test_inline_pipeline_only_compresses(self):
+        upload = make_image(size=(700, 350))
+        saved_formats = []
+        save = Image.Image.save
+
+        def record(image, fp, format=None, **params):
+            saved_formats.append(format)
+            return save(image, fp, format, **params)
+
+        with mock.patch.object(Image.Image, 'save', record):
+            art = self.create_art(upload)
+
+        # One encode for the compressed upload, none for responsive variants.
+        self.assertEqual(saved_formats, ['PNG'])
+        art.refresh_from_db()
+        self.assertEqual(art.thumbnail_variants, {})
+
+    @override_settings(MEDIA_PIPELINE_ASYNC=True)
+    def test_async_pipeline_queues_variants(self):
+        art = ArtModel.objects.create(
+            title='Test Art',
+            author=self.user,
+            thumbnail=make_image(size=(700, 350)),
+            model_file=SimpleUploadedFile('model.glb', b'glb'),
+        )
+
+        with mock.patch.object(process_uploaded_image, 'delay') as delay, \
+                self.captureOnCommitCallbacks(execute=True):
+            process_image_field(art, 'thumbnail')
+
+        delay.assert_called_once_with('afkat_art.ArtModel', art.pk, 'thumbnail', art.thumbnail.name, None, True)
+
+    def test_media_redirect_negotiates_format_and_width(self):
+        art = ArtModel.objects.create(
+            title='Test Art',
+            author=self.user,
+            thumbnail=make_image(size=(700, 350)),
+            model_file=SimpleUploadedFile('model.glb', b'glb'),
+        )
+        process_uploaded_image(art._meta.label, art.pk, 'thumbnail', art.thumbnail.name)
+        art.refresh_from_db()
+        url = reverse('media-redirect', kwargs={'name': art.thumbnail.name})
+
+        response = self.client.get(url, {'w': 300}, HTTP_ACCEPT='image/webp,image/*,*/*;q=0.8')
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response['Location'].endswith(art.thumbnail_variants['webp']['320']))
+        self.assertIn('Accept', response['Vary'])
+
+        response = self.client.get(url, HTTP_ACCEPT='image/png,image/*;q=0.8')
+        self.assertTrue(response['Location'].endswith(art.thumbnail_variants['jpeg']['700']))
+
+        response = self.client.get(reverse('media-redirect', kwargs={'name': 'images/missing.jpg'}))
+        self.assertEqual(response.status_code, 404)
+
+    def create_art(self, thumbnail):
+        serializer = ArtSerializer(data={
+            'title': 'Test Art',
+            'tags': [],
+            'thumbnail': thumbnail,
+            'model_file': SimpleUploadedFile('model.glb', b'glb'),
+        })
+        serializer.is_valid(raise_exception=True)
+        return serializer.save(author=self.user)
+
+    def test_identical_uploads_share_one_stored_image(self):
+        first = self.create_art(make_image(size=(400, 200)))
+        second = self.create_art(make_image('other.png', size=(400, 200)))
+
+        self.assertEqual(first.thumbnail.name, second.thumbnail.name)
+        self.assertTrue(first.thumbnail.name.startswith('images/'))
+
+    def test_shared_image_is_deleted_with_its_last_reference(self):
+        first = self.create_art(make_image(size=(400, 200)))
+        second = self.create_art(make_image(size=(400, 200)))
+        shared_name = first.thumbnail.name
+        storage = first.thumbnail.storage
+
+        for art in (first, second):
+            serializer = ArtSerializer(art, data={'thumbnail': make_image(size=(300, 300))}, partial=True)
+            serializer.is_valid(raise_exception=True)
+            serializer.save()
+            self.assertEqual(storage.exists(shared_name), art is first)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, STORAGES=TEST_STORAGES, CACHES=LOCMEM_CACHES)
+class BufferedCounterTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='StrongPassword123!'
+        )
+        counters._local.clear()
+        self.addCleanup(counters._local.clear)
+
+    def test_download_counts_are_buffered_until_flushed(self):
+        arts = [
+            ArtModel.objects.create(
+                title=f'Art {index}', author=self.user, thumbnail=make_image(size=(20, 20)),
+                model_file=SimpleUploadedFile('model.glb', b'glb'),
+            )
+            for index in range(2)
+        ]
+        for art in arts + arts[:1]:
+            increment(ArtModel, art.pk)
+
+        arts[0].refresh_from_db()
+        self.assertEqual(arts[0].download_count, 0)
+        self.assertEqual(pending_count(ArtModel, arts[0].pk), 2)
+        self.assertEqual(ArtSerializer(arts[0]).data['download_count'], 2)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(flush_counters(), 2)
+        self.assertEqual(sum(query['sql'].startswith('UPDATE') for query in queries), 1)
+
+        self.assertEqual(
+            list(ArtModel.objects.filter(pk__in=[art.pk for art in arts]).order_by('pk').values_list('download_count', flat=True)),
+            [2, 1],
+        )
+        self.assertEqual(pending_count(ArtModel, arts[0].pk), 0)
+
+    def test_list_reads_pending_counts_once_per_page(self):
+        arts = [
+            ArtModel.objects.create(
+                title=f'Art {index}', author=self.user, thumbnail=make_image(size=(20, 20)),
+                model_file=SimpleUploadedFile('model.glb', b'glb'),
+            )
+            for index in range(3)
+        ]
+        redis = mock.MagicMock()
+        pipe = redis.pipeline.return_value.__enter__.return_value
+        pipe.execute.return_value = [[b'2', None, None], [None, b'1', None]]
+
+        with mock.patch('afkat.utils.counters._redis', return_value=redis):
+            data = ArtSerializer(arts, many=True).data
+
+        self.assertEqual([art['download_count'] for art in data], [2, 1, 0])
+        self.assertEqual(pipe.execute.call_count, 1)
+        pipe.hmget.assert_any_call('counters:afkat_art.ArtModel:download_count', [art.pk for art in arts])
+        redis.hmget.assert_not_called()
+
+    def test_process_buffer_is_flushed_at_exit(self):
+        art = ArtModel.objects.create(
+            title='Art', author=self.user, thumbnail=make_image(size=(20, 20)),
+            model_file=SimpleUploadedFile('model.glb', b'glb'),
+        )
+        increment(ArtModel, art.pk)
+
+        counters._flush_local_at_exit()
+
+        art.refresh_from_db()
+        self.assertEqual(art.download_count, 1)
+        self.assertEqual(pending_count(ArtModel, art.pk), 0)
+
+
+class PreferredFormatTests(SimpleTestCase):
+
+    def test_prefers_modern_formats_the_browser_lists(self):
+        available = {'avif': {}, 'webp': {}, 'jpeg': {}}
+
+        self.assertEqual(preferred_format('image/avif,image/webp,*/*;q=0.8', available), 'avif')
+        self.assertEqual(preferred_format('image/avif;q=0,image/webp,*/*', available), 'webp')
+        self.assertEqual(preferred_format('image/*,*/*;q=0.8', available), 'jpeg')
+        self.assertEqual(preferred_format('', {'webp': {}}), None)
+
+
+class CompressImageTests(SimpleTestCase):
+
+    def noisy_image(self, size=(1200, 1200)):
+        buffer = io.BytesIO()
+        Image.frombytes('RGB', size, os.urandom(size[0] * size[1] * 3)).save(buffer, format='JPEG', quality=95)
+        return SimpleUploadedFile('noise.jpg', buffer.getvalue(), content_type='image/jpeg')
+
+    def test_size_budget_is_met_and_reported(self):
+        result = compress_image(self.noisy_image(), max_file_size_kb=300)
+
+        data = result.read()
+        self.assertLessEqual(len(data), 300 * 1024)
+        self.assertEqual(result.size, len(data))
+
+    def test_size_budget_is_bounded_in_encodes(self):
+        with mock.patch('afkat.utils.image_compression._encode', wraps=image_compression._encode) as encode:
+            compress_image(self.noisy_image(), max_file_size_kb=300, max_encodes=4)
+
+        self.assertLessEqual(encode.call_count, 5)
+
+    def test_transparent_image_falls_back_to_jpeg(self):
+        result = compress_image(make_image('icon.gif', size=(64, 64), format='GIF', mode='P'))
+
+        self.assertEqual(result.name, 'icon.jpg')
+        self.assertEqual(result.content_type, 'image/jpeg')
+
+    def test_large_jpeg_is_decoded_at_reduced_resolution(self):
+        upload = make_image('photo.jpg', size=(4000, 2000), format='JPEG')
+
+        img = image_compression._decode_reduced(Image.open(upload), max_size=500)
+
+        self.assertEqual(img.size, (1000, 500))
+        upload.seek(0)
+        self.assertEqual(Image.open(compress_image(upload, max_size=500)).size, (500, 250))
+
+
+class CompressImagesBatchTests(SimpleTestCase):
+
+    def test_ordered_results_match_input_order(self):
+        files = [make_image(f'image{index}.png', size=(300 + index * 100, 200)) for index in range(4)]
+
+        results = compress_images_batch(files, max_workers=2, max_size=250, format='JPEG')
+
+        self.assertEqual([result.name for result in results], [f'image{index}.jpg' for index in range(4)])
+        self.assertEqual(Image.open(results[0]).size, (250, 166))
+
+    def test_streaming_yields_failures_when_asked(self):
+        files = [make_image('good.png'), SimpleUploadedFile('bad.png', b'not an image')]
+
+        results = dict(compress_images_batch(files, ordered=False, max_workers=1, return_exceptions=True))
+
+        self.assertEqual(results[0].name, 'good.png')
+        self.assertIsInstance(results[1], Exception)
+
+
+class ImagePreflightTests(SimpleTestCase):
+
+    def test_accepts_regular_image(self):
+        info = preflight_image(make_image(size=(300, 200)))
+
+        self.assertEqual((info.format, info.width, info.height, info.frames), ('PNG', 300, 200, 1))
+
+    def test_rejects_pixel_bomb_without_decoding(self):
+        bomb = make_image('bomb.png', size=(12000, 10000), mode='1')
+
+        with mock.patch.object(Image.Image, 'load') as load:
+            with self.assertRaises(ValidationError):
+                preflight_image(bomb)
+
+        load.assert_not_called()
+
+    def test_rejects_oversized_upload(self):
+        with self.assertRaises(ValidationError):
+            preflight_image(make_image(size=(300, 200)), max_size_mb=0.0001)
+
+    def test_rejects_unsupported_format(self):
+        with self.assertRaises(ValidationError):
+            preflight_image(make_image('image.bmp', size=(10, 10), format='BMP'))
+
+
+class DownloadResponseTests(SimpleTestCase):
+    factory = RequestFactory()
+
+    def model_file(self, storage):
+        field_file = ArtModel(model_file='art/1/dragon model.glb').model_file
+        field_file.storage = storage
+        return field_file
+
+    def test_s3_download_redirects_to_presigned_url(self):
+        storage = S3StaticStorage(
+            bucket_name='afkat', access_key='key', secret_key='secret', region_name='eu-west-1', custom_domain=None,
+        )
+
+        response = download_response(self.factory.get('/download/'), self.model_file(storage))
+
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('Signature', response['Location'])
+        self.assertIn('response-content-disposition=attachment', response['Location'])
+        self.assertIn('no-store', response['Cache-Control'])
+
+    def test_filesystem_download_streams_through_the_app(self):
+        storage = FileSystemStorage(location=tempfile.mkdtemp())
+        storage.save('art/1/dragon model.glb', ContentFile(b'glTF'))
+
+        response = download_response(self.factory.get('/download/'), self.model_file(storage))
+
+        self.assertIsInstance(response, FileResponse)
+        self.assertEqual(b''.join(response.streaming_content), b'glTF')
+        self.assertIn('filename="dragon model.glb"', response['Content-Disposition'])
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertTrue(response.new_download)
+
+    def test_ranges_are_served_as_partial_content(self):
+        storage = FileSystemStorage(location=tempfile.mkdtemp())
+        storage.save('art/1/dragon model.glb', ContentFile(b'0123456789'))
+        model_file = self.model_file(storage)
+
+        resumed = download_response(self.factory.get('/download/', HTTP_RANGE='bytes=4-'), model_file)
+        self.assertEqual(resumed.status_code, 206)
+        self.assertEqual(resumed['Content-Range'], 'bytes 4-9/10')
+        self.assertEqual(b''.join(resumed.streaming_content), b'456789')
+        self.assertFalse(resumed.new_download)
+
+        several = download_response(self.factory.get('/download/', HTTP_RANGE='bytes=-2, 0-1, 1-2'), model_file)
+        body = b''.join(several.streaming_content)
+        self.assertTrue(several['Content-Type'].startswith('multipart/byteranges; boundary='))
+        self.assertEqual(int(several['Content-Length']), len(body))
+        self.assertIn(b'Content-Range: bytes 0-2/10\r\n\r\n012\r\n', body)
+        self.assertIn(b'Content-Range: bytes 8-9/10\r\n\r\n89\r\n', body)
+        self.assertTrue(several.new_download)
+
+        beyond = download_response(self.factory.get('/download/', HTTP_RANGE='bytes=10-'), model_file)
+        self.assertEqual(beyond.status_code, 416)
+        self.assertEqual(beyond['Content-Range'], 'bytes */10')
+
+    def test_stale_if_range_gets_the_whole_file(self):
+        storage = FileSystemStorage(location=tempfile.mkdtemp())
+        storage.save('art/1/dragon model.glb', ContentFile(b'0123456789'))
+        model_file = self.model_file(storage)
+        etag = download_response(self.factory.head('/download/'), model_file)['ETag']
+
+        current = download_response(self.factory.get('/download/', HTTP_RANGE='bytes=4-', HTTP_IF_RANGE=etag), model_file)
+        stale = download_response(self.factory.get('/download/', HTTP_RANGE='bytes=4-', HTTP_IF_RANGE='"0-0"'), model_file)
+
+        self.assertEqual(current.status_code, 206)
+        self.assertEqual(stale.status_code, 200)
+        self.assertEqual(b''.join(stale.streaming_content), b'0123456789')
+        self.assertTrue(stale.new_download)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), STORAGES=TEST_STORAGES)
+class ResumableUploadTests(SimpleTestCase):
+    session = {'model': 'afkat_art.ArtModel', 'field': 'model_file', 'key': '3d_models/a/model.glb', 'size': 10}
+
+    def test_concurrent_chunks_for_one_offset_do_not_both_append(self):
+        path = staging_path(self.session)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        with open(path, 'ab') as writing:
+            fcntl.flock(writing, fcntl.LOCK_EX)
+            with self.assertRaises(OffsetMismatch):
+                append_chunk(self.session, 0, io.BytesIO(b'0123456789'), 10)
+
+        self.assertEqual(append_chunk(self.session, 0, io.BytesIO(b'0123456789'), 10), 10)
+        with open(path, 'rb') as staged:
+            self.assertEqual(staged.read(), b'0123456789')
+
+    def test_s3_session_offset_and_completion_come_from_list_parts(self):
+        storage = S3StaticStorage(
+            bucket_name='afkat', access_key='key', secret_key='secret', region_name='eu-west-1', custom_domain=None,
+        )
+        session = {**self.session, 'size': 12, 'upload_id': 'upload-1', 'part_size': 8}
+        request = {'Bucket': 'afkat', 'Key': session['key'], 'UploadId': 'upload-1'}
+        parts = [
+            {'PartNumber': 2, 'ETag': '"b"', 'Size': 4},
+            {'PartNumber': 1, 'ETag': '"a"', 'Size': 8},
+        ]
+
+        with mock.patch('afkat.utils.direct_upload.session_storage', return_value=storage):
+            with Stubber(storage.connection.meta.client) as s3:
+                s3.add_response('list_parts', {'Parts': parts[:1]}, request)
+                s3.add_response('list_parts', {'Parts': parts}, request)
+                s3.add_response('complete_multipart_upload', {}, {
+                    **request, 'MultipartUpload': {'Parts': [{'PartNumber': 1, 'ETag': '"a"'}, {'PartNumber': 2, 'ETag': '"b"'}]},
+                })
+
+                self.assertEqual(upload_offset(session), 0)
+                _store_staged(session, storage)
+                s3.assert_no_pending_responses()
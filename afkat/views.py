@@ -0,0 +1,109 @@
+from django.core import signing
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.http import Http404, HttpResponse, HttpResponseRedirect
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_http_methods
+
+from afkat.utils.direct_upload import OffsetMismatch, append_chunk, load_session, session_storage, upload_offset
+from afkat.utils.image_store import variants_for
+from afkat.utils.image_variants import preferred_format
+
+
+@require_GET
+def media_redirect(request, name):
+    """
+    Redirects an <img src> to the best stored variant of ``name`` for the
+    browser's Accept header (AVIF, then WebP, then JPEG). ``?w=`` asks for the
+    smallest variant at least that wide. Falls back to the original image.
+    """
+    variants = variants_for(name)
+    img_format = preferred_format(request.headers.get('Accept', ''), variants)
+
+    if img_format:
+        widths = sorted(variants[img_format], key = int)
+        try:
+            wanted = int(request.GET['w'])
+        except (KeyError, ValueError):
+            wanted = None
+        width = widths[-1]
+        if wanted is not None:
+            width = next((width for width in widths if int(width) >= wanted), width)
+        target = variants[img_format][width]
+    elif variants or default_storage.exists(name):
+        target = name
+    else:
+        raise Http404("Image not found")
+
+    response = HttpResponseRedirect(default_storage.url(target))
+    patch_vary_headers(response, ['Accept'])
+    patch_cache_control(response, public = True, max_age = 60 * 60)
+    return response
+
+
+@csrf_exempt
+@require_http_methods(["PUT", "PATCH", "HEAD"])
+def direct_upload(request, token):
+    """
+    Stand-in for a presigned S3 URL on storages that cannot presign: the
+    signed ``token`` authorizes one PUT of at most the declared size to the
+    session's key. The body is streamed to storage, never read into memory.
+
+    For resumable sessions HEAD reports Upload-Offset and Upload-Length, so
+    an interrupted upload carries on where it stopped. On a filesystem
+    storage the chunks come here too: PATCH with an Upload-Offset header
+    appends the body at that offset (409 with the current offset if it does
+    not match or another chunk is being written). S3 sessions send their
+    parts to S3 directly.
+    """
+    try:
+        session = load_session(token)
+    except signing.BadSignature:
+        raise Http404("Unknown upload")
+
+    if request.method == "HEAD":
+        if not session.get("resumable"):
+            return HttpResponse(status = 405)
+        return _offset_response(200, upload_offset(session), session)
+
+    try:
+        length = int(request.META.get("CONTENT_LENGTH") or 0)
+    except ValueError:
+        length = 0
+
+    if request.method == "PATCH":
+        if not session.get("resumable") or "upload_id" in session:
+            return HttpResponse(status = 405)
+        try:
+            offset = int(request.headers["Upload-Offset"])
+        except (KeyError, ValueError):
+            return HttpResponse("Upload-Offset header required", status = 400)
+        if not length:
+            return HttpResponse(status = 411)
+        if offset + length > session["size"]:
+            return HttpResponse(status = 413)
+        try:
+            offset = append_chunk(session, offset, request, length)
+        except OffsetMismatch as exc:
+            return _offset_response(409, exc.offset, session)
+        return _offset_response(204, offset, session)
+
+    if not 0 < length <= session["size"]:
+        return HttpResponse(status = 413 if length else 411)
+
+    storage = session_storage(session)
+    content = File(request, name = session["key"])
+    content.size = length
+    if storage.exists(session["key"]):
+        storage.delete(session["key"])
+    storage.save(session["key"], content)
+    return HttpResponse(status = 204)
+
+
+def _offset_response(status, offset, session):
+    response = HttpResponse(status = status)
+    response["Upload-Offset"] = offset
+    response["Upload-Length"] = session["size"]
+    response["Cache-Control"] = "no-store"
+    return response
@@ -1,31 +1,51 @@
 from rest_framework import serializers
 
-from afkat.utils.serializer_field import CompressedImageField
+from afkat.utils.serializer_field import BufferedCountField, BufferedCountListSerializer, CompressedImageField, \
+    ImageVariantsField, MediaPipelineMixin, NegotiatedImageField
 from afkat_art.models import ArtModel, TagsModel, ArtRating, ArtComment
 
 
-class ArtSerializer(serializers.ModelSerializer):
+class ArtSerializer(MediaPipelineMixin, serializers.ModelSerializer):
     author = serializers.ReadOnlyField(source = "author.username")
     tags = serializers.SlugRelatedField(
         many = True, slug_field = "value", queryset = TagsModel.objects.all()
     )
     user_id = serializers.ReadOnlyField(source = "author.id")
+    download_count = BufferedCountField()
 
     thumbnail = CompressedImageField(
         max_size = 1200, quality = 80, maintain_format = True, max_file_size_kb = 500
     )
+    thumbnail_variants = ImageVariantsField()
+    thumbnail_src = NegotiatedImageField(source = "thumbnail")
+    # Set instead of sending model_file when it follows through an upload session.
+    direct_upload = serializers.BooleanField(write_only = True, required = False)
 
     class Meta:
         model = ArtModel
+        list_serializer_class = BufferedCountListSerializer
         fields = "__all__"
         read_only_fields = ["download_count"]
+        extra_kwargs = {"model_file": {"required": False}}
+
+    def validate(self, data):
+        if self.instance is None and not data.get("model_file") and not data.get("direct_upload"):
+            raise serializers.ValidationError(
+                {"error": "Send a model_file, or set direct_upload to send it through an upload session"}
+            )
+        return data
 
     def create(self, validated_data):
+        validated_data.pop("direct_upload", None)
         tags_data = validated_data.pop("tags")
         art = ArtModel.objects.create(**validated_data)
         art.tags.set(tags_data)
         return art
 
+    def update(self, instance, validated_data):
+        validated_data.pop("direct_upload", None)
+        return super().update(instance, validated_data)
+
 
 class ArtCommentSerializer(serializers.ModelSerializer):
     username = serializers.ReadOnlyField(source = 'user.username')
@@ -1,5 +1,4 @@
-from django.http import FileResponse
-from django.db.models import F
+from django.http import Http404
 from django.shortcuts import get_object_or_404
 from django.utils.decorators import method_decorator
 from django.views.decorators.cache import cache_page
@@ -10,14 +9,18 @@ from rest_framework.decorators import action
 from rest_framework.exceptions import PermissionDenied
 from rest_framework.response import Response
 
+from afkat.utils.counters import increment
+from afkat.utils.direct_upload import DirectUploadMixin
+from afkat.utils.downloads import download_response
 from afkat_art.api.serializers import ArtSerializer, ArtRatingSerializer, ArtCommentSerializer
 from afkat_game.api.filters import ArtFilter
+from afkat_home.analytics import AnalyticsMixin
 from .pagination import GameAndArtLayoutPagination
 from ..models import ArtModel, ArtRating, ArtComment
 from ..services.art_services import validate_art_file
 
 
-class ArtViewSet(viewsets.ModelViewSet):
+class ArtViewSet(AnalyticsMixin, DirectUploadMixin, viewsets.ModelViewSet):
     queryset = ArtModel.objects.all().select_related("author").prefetch_related("tags")
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
     serializer_class = ArtSerializer
@@ -25,9 +28,11 @@ class ArtViewSet(viewsets.ModelViewSet):
     filterset_class = ArtFilter
     pagination_class = GameAndArtLayoutPagination
     search_fields = ["title__icontains"]
+    direct_upload_fields = {"model_file": validate_art_file}
+    owner_field = "author"
 
     def perform_create(self, serializer):
-        validate_art_file(self, serializer.validated_data["model_file"])
+        validate_art_file(self, serializer.validated_data.get("model_file"))
         serializer.save(author = self.request.user)
 
     def perform_destroy(self, instance):
@@ -83,11 +88,11 @@ class ArtViewSet(viewsets.ModelViewSet):
     @action(methods = ["get"], detail = True, url_path = "download")
     def download_art(self, request, pk = None):
         art = get_object_or_404(ArtModel, pk = pk)
-        art.download_count += F("download_count")+1
-        art.save(update_fields = ["download_count"])
-        response = FileResponse(
-            art.model_file.open("rb"), as_attachment = True, filename = art.model_file.name
-        )
+        if not art.model_file:
+            raise Http404("No model file to download")
+        response = download_response(request, art.model_file)
+        if response.new_download:
+            increment(ArtModel, art.pk)
         return response
 
 
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 05:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('afkat_art', '0006_artmodel_rating'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='artmodel',
+            name='thumbnail_variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
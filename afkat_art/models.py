@@ -19,6 +19,7 @@ class ArtModel(models.Model):
         null = True,
         blank = True,
     )
+    thumbnail_variants = models.JSONField(default = dict, blank = True)
     author = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete = models.CASCADE)
     model_file = models.FileField(
         upload_to = "3d_models/", help_text = "Upload 3D files (.obj ,.fbx,.glb ,.gltf)"
@@ -5,10 +5,14 @@ from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import SimpleUploadedFile
 from rest_framework.test import APIClient
 from rest_framework import status
+from afkat_art.api.serializers import ArtSerializer
 from afkat_art.models import ArtModel, ArtComment, ArtRating, TagsModel
+import io
 import tempfile
 import os
 
+from PIL import Image
+
 User = get_user_model()
 
 class ArtModelTests(TestCase):
@@ -220,6 +224,31 @@ class ArtRatingTests(TestCase):
         self.assertEqual(str(rating), expected_str)
 
 
+class ArtSerializerTests(TestCase):
+    def setUp(self):
+        self.tag = TagsModel.objects.create(value='test_tag')
+        thumbnail = io.BytesIO()
+        Image.new('RGB', (8, 8)).save(thumbnail, 'PNG')
+        self.data = {
+            'title': 'New Test Art',
+            'description': 'New Test Description',
+            'tags': ['test_tag'],
+            'thumbnail': SimpleUploadedFile('thumbnail.png', thumbnail.getvalue(), content_type='image/png'),
+        }
+
+    def test_model_file_is_required_without_direct_upload(self):
+        serializer = ArtSerializer(data=self.data)
+
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('error', serializer.errors)
+
+    def test_direct_upload_allows_leaving_out_model_file(self):
+        serializer = ArtSerializer(data={**self.data, 'direct_upload': True})
+
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        self.assertNotIn('model_file', serializer.validated_data)
+
+
 class ArtAPITests(TestCase):
     def setUp(self):
         self.client = APIClient()
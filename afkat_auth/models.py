@@ -61,6 +61,7 @@ class Profile(models.Model):
     phone = PhoneNumberField(_("Phone Number"), blank=True,null =  True, region=None)
     country = CountryField(blank=True, null=True, blank_label="Select Country")
     profile_image = models.ImageField(default = "default_images/default_profile.jpg",upload_to="profile_pics/", blank=True, null=True)
+    profile_image_variants = models.JSONField(default = dict, blank = True)
     github_link = models.URLField(blank=True, null=True)
     linkedin_link = models.URLField(blank=True, null=True)
 
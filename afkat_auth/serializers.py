@@ -11,7 +11,14 @@ from rest_framework.validators import UniqueValidator
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from rest_framework_simplejwt.tokens import Token
 
-from afkat.utils.serializer_field import CompressedImageField
+from afkat.utils.serializer_field import (
+    CompressedImageField,
+    ImageVariantsField,
+    NegotiatedImageField,
+    pending_image_fields,
+    process_pending_images,
+    store_pending_images,
+)
 from afkat_auth.permissions import UserIsOwnerOrReadOnly
 from .models import User, Profile, Follow
 
@@ -97,9 +104,12 @@ class ProfileSerializer(CountryFieldMixin, serializers.ModelSerializer):
         maintain_format=True,
         max_file_size_kb=500
     )
+    profile_image_variants = ImageVariantsField()
+    profile_image_src = NegotiatedImageField(source="profile_image")
+
     class Meta:
         model = Profile
-        fields = ["phone", "country", "profile_image", "github_link", "linkedin_link"]
+        fields = ["phone", "country", "profile_image", "profile_image_variants", "profile_image_src", "github_link", "linkedin_link"]
         extra_kwargs = {
             "phone": {"required": False},
             "country": {"required": False},
@@ -129,9 +139,12 @@ class UserProfileSerializer(UserDetailsSerializer):
         instance = super().update(instance, validated_data)
 
         if profile_data and hasattr(instance, "userProfile"):
+            pending = pending_image_fields(self.fields["userProfile"], profile_data)
+            replaced = store_pending_images(pending, profile_data, instance.userProfile)
             for attr, value in profile_data.items():
                 setattr(instance.userProfile, attr, value)
             instance.userProfile.save()
+            process_pending_images(instance.userProfile, pending, replaced)
 
         return instance
 
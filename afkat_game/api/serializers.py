@@ -1,7 +1,8 @@
 from django.contrib.auth import get_user_model
 from rest_framework import serializers
 
-from afkat.utils.serializer_field import CompressedImageField
+from afkat.utils.serializer_field import BufferedCountField, BufferedCountListSerializer, CompressedImageField, \
+    ImageVariantsField, MediaPipelineMixin, NegotiatedImageField
 from afkat_game.models import Game, GameComments, GameRating, Tags, GameJam
 from afkat_game.services.game_jam_service import join_game_jam, leave_game_jam
 from afkat_game.services.game_service import get_user_rating
@@ -32,10 +33,12 @@ class GameRatingSerializer(serializers.ModelSerializer):
         read_only_fields = ['user', 'username']
 
 
-class GameDetailSerializer(serializers.ModelSerializer):
+class GameDetailSerializer(MediaPipelineMixin, serializers.ModelSerializer):
     username = serializers.ReadOnlyField(source = 'creator.username')
     user_id = serializers.ReadOnlyField(source = 'creator.id')
     user_rating = serializers.SerializerMethodField()
+    download_count = BufferedCountField()
+    play_count = BufferedCountField()
     tags = serializers.SlugRelatedField(
         many = True,
         slug_field = "value",
@@ -46,14 +49,20 @@ class GameDetailSerializer(serializers.ModelSerializer):
         max_size = 1200,
         quality = 80,
         maintain_format = True,
-        max_file_size_kb = 500
+        max_file_size_kb = 500,
+        max_upload_size_mb = 5,
     )
+    thumbnail_variants = ImageVariantsField()
+    thumbnail_src = NegotiatedImageField(source = 'thumbnail')
 
     class Meta:
         model = Game
+        list_serializer_class = BufferedCountListSerializer
         fields = ['id', 'user_id', 'username', 'title', 'description', 'user_rating', 'tags','created_at','updated_at',
-                  'download_count', 'rating', 'thumbnail', "game_file", 'game_file_win', 'webgl_index_path', ]
-        read_only_fields = ['user_id','username', 'download_count', 'created_at', 'updated_at', 'webgl_index_path']
+                  'download_count', 'play_count', 'rating', 'thumbnail', 'thumbnail_variants', 'thumbnail_src', "game_file", 'game_file_win',
+                  'webgl_index_path', 'build_status', ]
+        read_only_fields = ['user_id','username', 'download_count', 'created_at', 'updated_at', 'webgl_index_path',
+                            'build_status']
         extra_kwargs = {
             'rating': {'required': False},
         }
@@ -67,7 +76,7 @@ class GameDetailSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
-class GameJamSerializer(serializers.ModelSerializer):
+class GameJamSerializer(MediaPipelineMixin, serializers.ModelSerializer):
     created_by = serializers.ReadOnlyField(source = 'created_by.username')
     is_active = serializers.ReadOnlyField()
     participants_count = serializers.SerializerMethodField()
@@ -77,6 +86,13 @@ class GameJamSerializer(serializers.ModelSerializer):
     submitted_games = serializers.SlugRelatedField(
         many = True , read_only = True, slug_field = 'title'
     )
+    game_jam_thumbnail = CompressedImageField(
+        max_size = 1200,
+        quality = 80,
+        maintain_format = True,
+        max_file_size_kb = 500,
+        required = False,
+    )
 
     class Meta:
         model = GameJam
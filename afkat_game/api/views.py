@@ -1,9 +1,8 @@
 import requests
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.core.serializers import get_serializer
-from django.db import transaction
-from django.db.models import F, Prefetch
-from django.http import FileResponse, HttpResponseRedirect, JsonResponse, HttpRequest, HttpResponse
+from django.db.models import Prefetch
+from django.http import Http404, HttpResponseRedirect, JsonResponse, HttpRequest, HttpResponse
 from django.views import View
 from django.utils import timezone
 from django.utils.decorators import method_decorator
@@ -28,18 +27,24 @@ from afkat_game.api.serializers import (
     GameJamParticipationSerializer,
 )
 from afkat_game.models import Game, GameComments, GameRating, GameJam
+from afkat_home.analytics import AnalyticsMixin
 from afkat_home.api.serializers import AuthorSerializer
+from afkat_home.models import ActivityRollup
 from .filters import GameFilter
 from ..services.game_service import (
     validate_game_file,
     validate_cover_image,
-    process_webgl_upload,
 )
+from ..services.webgl_service import preflight_archive
+from ..tasks import retire_live_build, schedule_game_build
 
+from afkat.utils.direct_upload import DirectUploadMixin
+from afkat.utils.counters import increment
+from afkat.utils.downloads import download_response
 from afkat_art.api.pagination import GameAndArtLayoutPagination
 
 
-class GameViewSet(viewsets.ModelViewSet):
+class GameViewSet(AnalyticsMixin, DirectUploadMixin, viewsets.ModelViewSet):
     queryset = Game.objects.all().select_related("creator").prefetch_related("tags")
     serializer_class = GameDetailSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
@@ -54,6 +59,9 @@ class GameViewSet(viewsets.ModelViewSet):
     search_fields = ["title"]
     ordering_fields = ["title", "created_at"]
     ordering = ["-created_at"]
+    direct_upload_fields = {"game_file": validate_game_file, "game_file_win": validate_game_file}
+    owner_field = "creator"
+    analytics_events = (ActivityRollup.DOWNLOAD, ActivityRollup.PLAY)
 
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -86,26 +94,34 @@ class GameViewSet(viewsets.ModelViewSet):
 
         if 'game_file' in serializer.validated_data:
             validate_game_file(self, serializer.validated_data["game_file"])
+            if serializer.validated_data["game_file"]:
+                preflight_archive(serializer.validated_data["game_file"])
             if instance.game_file != serializer.validated_data["game_file"]:
-                relative_path = process_webgl_upload(
-                    serializer.validated_data["game_file"], instance.id
-                )
-                serializer.save(webgl_index_path = relative_path)
+                if serializer.validated_data["game_file"] is None:
+                    retire_live_build(serializer.save())
+                    return
+                game = serializer.save()
+                schedule_game_build(game)
+                game.refresh_from_db()
                 return
 
         serializer.save()
-    @transaction.atomic
+
     def perform_create(self, serializer):
         validate_cover_image(self, serializer.validated_data["thumbnail"])
-        validate_game_file(self, serializer.validated_data["game_file_win"])
-        validate_game_file(self, serializer.validated_data["game_file"])
+        validate_game_file(self, serializer.validated_data.get("game_file_win"))
+        validate_game_file(self, serializer.validated_data.get("game_file"))
+        if serializer.validated_data.get("game_file"):
+            preflight_archive(serializer.validated_data["game_file"])
         game = serializer.save(creator=self.request.user)
 
-        relative_path = process_webgl_upload(
-            serializer.validated_data["game_file"], game.id
-        )
-        game.webgl_index_path = relative_path
-        game.save(update_fields=["webgl_index_path"])
+        if game.game_file:
+            schedule_game_build(game)
+            game.refresh_from_db()
+
+    def upload_finalized(self, instance, field_name):
+        if field_name == "game_file":
+            schedule_game_build(instance)
 
     def perform_destroy(self, instance):
         if instance.creator == self.request.user:
@@ -152,17 +168,37 @@ class GameViewSet(viewsets.ModelViewSet):
             game.refresh_from_db()
             return Response({"rating": serializer.data, "game_avg_rating": game.rating})
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-    @transaction.atomic
+
+    @action(detail=True, methods=["get"], url_path="build-status")
+    def build_status(self, request, pk=None):
+        game = self.get_object()
+        return Response({
+            "status": game.build_status,
+            "progress": game.build_progress,
+            "total": game.build_total,
+            "error": game.build_error or None,
+            "webgl_index_path": game.webgl_index_path,
+            "diff": game.build_diff,
+        })
+
     @action(methods=["get"], detail=True,permission_classes = ([IsAuthenticated]) , url_path="download")
     def download_game(self, request, pk=None):
         game = get_object_or_404(Game, pk=pk)
-        Game.objects.filter(pk = pk).update(download_count = F("download_count") + 1)
-        game.refresh_from_db()
-        response = FileResponse(
-            game.game_file_win.open("rb"), as_attachment=True, filename=game.game_file_win.name
-        )
+        if not game.game_file_win:
+            raise Http404("No Windows build to download")
+        response = download_response(request, game.game_file_win)
+        if response.new_download:
+            increment(Game, game.pk)
         return response
 
+    @action(methods=["post"], detail=True, permission_classes=[IsAuthenticated], url_path="play")
+    def play_game(self, request, pk=None):
+        game = get_object_or_404(Game, pk=pk)
+        if not game.webgl_index_path:
+            raise Http404("No WebGL build to play")
+        increment(Game, game.pk, "play_count")
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
 
 class GameCommentViewSet(viewsets.ModelViewSet):
     queryset = GameComments.objects.all().select_related("user", "game")
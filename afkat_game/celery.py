@@ -0,0 +1,10 @@
+import os
+
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'afkat.settings')
+
+app = Celery('afkat')
+app.config_from_object('django.conf:settings', namespace = 'CELERY')
+app.autodiscover_tasks()
+app.autodiscover_tasks(['afkat.utils'])
@@ -0,0 +1,22 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from afkat_game.tasks import purge_builds
+
+
+class Command(BaseCommand):
+    help = (
+        "Deletes WebGL build versions retired longer than WEBGL_BUILD_GRACE_PERIOD ago and the "
+        "shared build blobs no remaining build uses. Runs hourly as purge_retired_builds on Celery beat."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--grace-hours", type=float, default=None, help="Override WEBGL_BUILD_GRACE_PERIOD")
+
+    def handle(self, *args, grace_hours=None, **options):
+        grace = None if grace_hours is None else timedelta(hours=grace_hours)
+        versions, files, blobs = purge_builds(grace)
+        self.stdout.write(self.style.SUCCESS(
+            f"Purged {versions} retired build version(s) ({files} file(s)) and {blobs} unused blob(s)"
+        ))
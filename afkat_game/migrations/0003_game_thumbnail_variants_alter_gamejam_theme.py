@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-18 05:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('afkat_game', '0002_alter_gamecomments_user_alter_gamerating_user'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='thumbnail_variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AlterField(
+            model_name='gamejam',
+            name='theme',
+            field=models.CharField(db_index=True, help_text='theme of the game jam', max_length=1000),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 05:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('afkat_game', '0003_game_thumbnail_variants_alter_gamejam_theme'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='build_manifest',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
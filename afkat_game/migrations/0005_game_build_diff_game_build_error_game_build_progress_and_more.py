@@ -0,0 +1,38 @@
+# Generated by Django 5.2 on 2026-10-18 06:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('afkat_game', '0004_game_build_manifest'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='build_diff',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='game',
+            name='build_error',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='game',
+            name='build_progress',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='game',
+            name='build_status',
+            field=models.CharField(choices=[('queued', 'Queued'), ('extracting', 'Extracting'), ('uploading', 'Uploading'), ('ready', 'Ready'), ('failed', 'Failed')], default='ready', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='game',
+            name='build_total',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 06:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('afkat_game', '0006_game_build_sequence_game_build_version_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='play_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
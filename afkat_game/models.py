@@ -26,6 +26,7 @@ class Game(models.Model):
         null=True,
         blank=True,
     )
+    thumbnail_variants = models.JSONField(default=dict, blank=True)
     creator = models.ForeignKey(
         settings.AUTH_USER_MODEL, on_delete=models.CASCADE, db_index=True
     )
@@ -34,6 +35,7 @@ class Game(models.Model):
     download_count = models.IntegerField(
         default=0, validators=[MinValueValidator(0)], db_index=True
     )
+    play_count = models.PositiveIntegerField(default=0)
     rating = models.FloatField(
         default=0.0,
         validators=[MinValueValidator(1.0), MaxValueValidator(5.0)],
@@ -46,6 +48,31 @@ class Game(models.Model):
         blank=True,
     )
     webgl_index_path = models.CharField(max_length=255, blank=True, null=True)
+    # path -> {"sha256", "size"} (plus "blob" for shared files) of every file of the live WebGL build
+    build_manifest = models.JSONField(default=dict, blank=True)
+    # The live build is in games/{id}/v{build_version}/; build_sequence is the last version handed out.
+    build_version = models.PositiveIntegerField(default=0)
+    build_sequence = models.PositiveIntegerField(default=0)
+    # [{"version", "retired_at", "blobs"}] of replaced builds awaiting purge_retired_builds
+    retired_builds = models.JSONField(default=list, blank=True)
+
+    BUILD_QUEUED = "queued"
+    BUILD_EXTRACTING = "extracting"
+    BUILD_UPLOADING = "uploading"
+    BUILD_READY = "ready"
+    BUILD_FAILED = "failed"
+    BUILD_STATUS_CHOICES = (
+        (BUILD_QUEUED, "Queued"),
+        (BUILD_EXTRACTING, "Extracting"),
+        (BUILD_UPLOADING, "Uploading"),
+        (BUILD_READY, "Ready"),
+        (BUILD_FAILED, "Failed"),
+    )
+    build_status = models.CharField(max_length=20, choices=BUILD_STATUS_CHOICES, default=BUILD_READY)
+    build_progress = models.PositiveIntegerField(default=0)
+    build_total = models.PositiveIntegerField(default=0)
+    build_error = models.TextField(blank=True, default="")
+    build_diff = models.JSONField(default=dict, blank=True)
 
     #     dont forget to add (progress, achievements)
 
@@ -0,0 +1,172 @@
+"""
+Benchmarks ingesting a 7z WebGL build: the single-pass streaming path used
+by process_webgl_upload (SevenZipMembers) against extracting the whole
+archive to a temporary directory and uploading the extracted tree.
+
+    python -m afkat_game.services.webgl_benchmark [--scale 0.25] [--runs 1] [--upload-mbps 100]
+
+The build mimics a Unity WebGL export: index.html and TemplateData, a loader,
+framework.js, a .wasm, a large .data file of mostly incompressible textures
+and a few StreamingAssets bundles. Uploads go to a local storage throttled to
+--upload-mbps per connection so that overlapping decompression with uploading
+shows up as it does against S3. Every measurement runs in a fresh process and
+reports wall time, peak RSS and the most bytes written to temporary disk.
+"""
+import argparse
+import functools
+import multiprocessing
+import os
+import random
+import resource
+import shutil
+import tempfile
+import time
+
+# (path, megabytes at scale 1, share of incompressible bytes)
+UNITY_BUILD = [
+    ('index.html', 0.004, 0.0),
+    ('TemplateData/style.css', 0.003, 0.0),
+    ('TemplateData/favicon.ico', 0.005, 1.0),
+    ('TemplateData/unity-logo-dark.png', 0.01, 1.0),
+    ('TemplateData/progress-bar-full-dark.png', 0.002, 1.0),
+    ('Build/game.loader.js', 0.02, 0.0),
+    ('Build/game.framework.js', 0.4, 0.05),
+    ('Build/game.wasm', 25, 0.3),
+    ('Build/game.data', 120, 0.7),
+    ('StreamingAssets/aa/catalog.json', 0.2, 0.0),
+    ('StreamingAssets/aa/WebGL/defaultlocalgroup_assets_all.bundle', 6, 1.0),
+    ('StreamingAssets/aa/WebGL/levels_scenes_all.bundle', 4, 1.0),
+]
+
+WORDS = [b'function', b'return', b'var', b'Module', b'HEAPU8', b'this', b'unity', b'asset', b'0x00', b'null']
+
+
+def build_file(size, incompressible, seed):
+    rng = random.Random(seed)
+    noise = int(size * incompressible)
+    text = b' '.join(rng.choice(WORDS) for _ in range((size - noise) // 6 + 1))
+    return rng.randbytes(noise) + text[:size - noise]
+
+
+def write_archive(path, scale):
+    """Writes the synthetic build to a solid 7z at ``path``; returns its uncompressed size."""
+    import py7zr
+
+    total = 0
+    with py7zr.SevenZipFile(path, 'w') as archive:
+        for seed, (name, megabytes, incompressible) in enumerate(UNITY_BUILD):
+            data = build_file(max(1, int(megabytes * scale * 1024 * 1024)), incompressible, seed)
+            archive.writestr(data, name)
+            total += len(data)
+    return total
+
+
+def _peak_rss_kb():
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _throttled_storage(location, upload_mbps):
+    from django.core.files.storage import FileSystemStorage
+
+    class ThrottledStorage(FileSystemStorage):
+        def _save(self, name, content):
+            if upload_mbps:
+                time.sleep(content.size / (upload_mbps * 1024 * 1024))
+            return super()._save(name, content)
+
+    return ThrottledStorage(location = location)
+
+
+def _disk_usage(path):
+    return sum(
+        os.path.getsize(os.path.join(root, file)) for root, dirs, files in os.walk(path) for file in files
+    )
+
+
+def _measure(args):
+    method, archive_path, upload_mbps = args
+    import django
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'afkat.settings')
+    django.setup()
+    import py7zr
+    from django.conf import settings
+
+    from afkat_game.services import webgl_service
+
+    temp_dir = tempfile.mkdtemp()
+    storage = _throttled_storage(os.path.join(temp_dir, 'storage'), upload_mbps)
+    baseline_kb = _peak_rss_kb()
+    start = time.perf_counter()
+    try:
+        with py7zr.SevenZipFile(archive_path, 'r') as archive:
+            if method == 'streaming':
+                members = webgl_service.SevenZipMembers(archive, settings.WEBGL_7Z_BUFFER_BYTES)
+                try:
+                    report = webgl_service.upload_webgl_build(members, 'games/1/', storage)
+                finally:
+                    members.close()
+                temp_bytes = members.spooled_bytes
+            else:
+                extract_dir = os.path.join(temp_dir, 'build')
+                archive.extractall(path = extract_dir)
+                temp_bytes = _disk_usage(extract_dir)
+                members = [
+                    (os.path.relpath(os.path.join(root, file), extract_dir).replace('\\', '/'),
+                     os.path.getsize(os.path.join(root, file)), functools.partial(open, os.path.join(root, file), 'rb'))
+                    for root, dirs, files in os.walk(extract_dir) for file in files
+                ]
+                report = webgl_service.upload_webgl_build(members, 'games/1/', storage)
+        elapsed = time.perf_counter() - start
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors = True)
+    return {
+        'seconds': round(elapsed, 2),
+        'peak_rss_mb': round((_peak_rss_kb() - baseline_kb) / 1024, 1),
+        'temp_disk_mb': round(temp_bytes / (1024 * 1024), 1),
+        'files': report['files'],
+    }
+
+
+def run(scale, runs, upload_mbps):
+    context = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory() as temp_dir:
+        archive_path = os.path.join(temp_dir, 'build.7z')
+        total = write_archive(archive_path, scale)
+        results = {
+            'uncompressed_mb': round(total / (1024 * 1024), 1),
+            'archive_mb': round(os.path.getsize(archive_path) / (1024 * 1024), 1),
+        }
+        for method in ('extractall', 'streaming'):
+            with context.Pool(1, maxtasksperchild = 1) as pool:
+                samples = [pool.apply(_measure, ((method, archive_path, upload_mbps),)) for _ in range(runs)]
+            results[method] = min(samples, key = lambda sample: sample['seconds'])
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.split('\n\n')[0])
+    parser.add_argument('--scale', type = float, default = 0.25, help = 'Build size relative to ~155 MB')
+    parser.add_argument('--runs', type = int, default = 1)
+    parser.add_argument('--upload-mbps', type = float, default = 100, help = 'Per-connection upload speed, 0 for none')
+    args = parser.parse_args()
+
+    results = run(args.scale, args.runs, args.upload_mbps)
+    print(f"{results['uncompressed_mb']} MB build, {results['archive_mb']} MB as 7z")
+    for method in ('extractall', 'streaming'):
+        result = results[method]
+        print(
+            f"{method:>11}: {result['seconds']:7.2f} s  peak RSS +{result['peak_rss_mb']:7.1f} MB"
+            f"  temp disk {result['temp_disk_mb']:7.1f} MB  {result['files']} files"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,851 @@
+# afkat_game/services/webgl_service.py
+import hashlib
+import io
+import logging
+import mimetypes
+import os
+import posixpath
+import queue
+import re
+import stat
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+
+import brotli
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import InvalidStorageError, default_storage, storages
+from rest_framework import serializers
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+
+# Suffixes of files Unity already compressed at build time.
+PRECOMPRESSED_SUFFIXES = {'.br': 'br', '.gz': 'gzip'}
+BROTLI_EXTENSIONS = {'.wasm', '.data', '.js', '.json', '.css', '.mem', '.symbols', '.txt', '.svg'}
+BROTLI_MIN_SIZE = 1024
+
+# Highly compressible files below this size cannot do harm, so their ratio is not checked.
+RATIO_CHECK_MIN_BYTES = 1024 * 1024
+
+# Build files whose references to other files are rewritten to blob URLs.
+DOCUMENT_EXTENSIONS = {'.html', '.css', '.json'}
+DOCUMENT_MAX_SIZE = 1024 * 1024
+# Directories the player reads from by path at runtime, kept below games/{id}/.
+PATH_ADDRESSED_DIRS = {'StreamingAssets'}
+
+_ASSIGNMENT = re.compile(r'\b(?:var|let|const)\s+(\w+)\s*=\s*(["\'])([^"\'\n]*)\2')
+_CONCATENATION = re.compile(r'\b(\w+)\s*\+\s*(["\'])([^"\'\n]*)\2')
+_LITERAL = re.compile(r'(["\'])([^"\'\s<>()]+)\1')
+_CSS_URL = re.compile(r'url\(\s*([^)"\'\s]+)\s*\)')
+_VERSION_DIR = re.compile(r'v\d+')
+
+
+def webgl_storage():
+    """The "webgl" storage alias when configured, else the default storage."""
+    try:
+        return storages['webgl']
+    except InvalidStorageError:
+        return default_storage
+
+
+def object_parameters(rel_path):
+    """
+    S3 metadata for a build file: the Content-Type of the underlying file
+    (AWS_S3_CUSTOM_DOMAIN_MIME_TYPES first), Content-Encoding for .br/.gz
+    builds and WEBGL_CACHE_CONTROL. Every key a build is written to, blob or
+    versioned directory, is written once and never changes, so the whole
+    build is cached as immutable.
+    """
+    base, suffix = _split_precompressed(rel_path)
+    encoding = PRECOMPRESSED_SUFFIXES.get(suffix)
+    file_ext = posixpath.splitext(base)[1].lower()
+
+    params = {
+        'ContentType': (
+            settings.AWS_S3_CUSTOM_DOMAIN_MIME_TYPES.get(file_ext)
+            or mimetypes.guess_type(base)[0]
+            or 'application/octet-stream'
+        ),
+        'CacheControl': settings.WEBGL_CACHE_CONTROL,
+    }
+    if encoding:
+        params['ContentEncoding'] = encoding
+    return params
+
+
+def blob_key(sha256, rel_path):
+    """Storage key of a shared build file, keeping the extensions that set its type and encoding."""
+    base, suffix = _split_precompressed(rel_path)
+    return f"{settings.WEBGL_BLOB_LOCATION}/{sha256}{posixpath.splitext(base)[1].lower()}{suffix}"
+
+
+def build_dir(game_id, version):
+    """Directory of version ``version`` of a game's WebGL build; version 0 is the unversioned layout."""
+    return f"games/{game_id}/v{version}/" if version else f"games/{game_id}/"
+
+
+def member_kind(rel_path, size):
+    """
+    How a build file is stored: "document" (html, css and json, rewritten to
+    point at blobs and kept in the build directory), "path" (files the player
+    loads by path, such as StreamingAssets) or "blob" (everything else,
+    stored once per content under WEBGL_BLOB_LOCATION).
+    """
+    if PATH_ADDRESSED_DIRS.intersection(rel_path.split('/')[:-1]):
+        return 'path'
+    if posixpath.splitext(_split_precompressed(rel_path)[0])[1].lower() in DOCUMENT_EXTENSIONS:
+        if _split_precompressed(rel_path)[1] or size > DOCUMENT_MAX_SIZE:
+            return 'path'
+        return 'document'
+    return 'blob'
+
+
+def rewrite_references(rel_path, text, urls):
+    """
+    Points the references in the build document ``rel_path`` at ``urls``, a
+    map of build-relative paths to where those files are served from.
+    Quoted paths, CSS url() and Unity's ``buildUrl + "/file"`` concatenations
+    are resolved against the document's directory; anything that does not
+    name a file in ``urls`` is left as it is.
+    """
+    base_dir = posixpath.dirname(rel_path)
+
+    def resolve(ref):
+        if not ref or ref.startswith(('/', '#', 'data:')) or '://' in ref:
+            return None
+        return urls.get(posixpath.normpath(posixpath.join(base_dir, ref)))
+
+    variables = {match.group(1): match.group(3) for match in _ASSIGNMENT.finditer(text)}
+
+    def concatenation(match):
+        name, quote, tail = match.groups()
+        url = resolve(variables[name] + tail) if name in variables else None
+        return f"{quote}{url}{quote}" if url else match.group(0)
+
+    def literal(match):
+        quote, ref = match.groups()
+        url = resolve(ref)
+        return f"{quote}{url}{quote}" if url else match.group(0)
+
+    def css_url(match):
+        url = resolve(match.group(1))
+        return f"url({url})" if url else match.group(0)
+
+    text = _CONCATENATION.sub(concatenation, text)
+    text = _LITERAL.sub(literal, text)
+    return _CSS_URL.sub(css_url, text)
+
+
+@dataclass(frozen = True)
+class ArchiveInfo:
+    format: str
+    files: int
+    compressed_bytes: int
+    uncompressed_bytes: int
+    ratio: float
+
+
+def preflight_archive(archive_file, max_files = None, max_uncompressed_mb = None, max_ratio = None):
+    """
+    Checks a build archive using only its zip central directory or 7z
+    header, before any member is decompressed, so the cost grows with the
+    number of files rather than with their size.
+
+    Args:
+        archive_file: Uploaded or stored .zip / .7z file
+        max_files: Most files accepted (defaults to WEBGL_ARCHIVE_MAX_FILES)
+        max_uncompressed_mb: Largest accepted extracted size (defaults to WEBGL_ARCHIVE_MAX_UNCOMPRESSED_MB)
+        max_ratio: Highest accepted uncompressed / compressed ratio, for the
+            whole archive and for each zip member, once they expand past
+            RATIO_CHECK_MIN_BYTES (defaults to WEBGL_ARCHIVE_MAX_RATIO)
+
+    Returns:
+        ArchiveInfo read from the directory
+
+    Raises:
+        serializers.ValidationError if the archive cannot be read, has a
+        member path that is absolute, climbs out with "..", or is a symlink,
+        has members whose data overlaps, or exceeds one of the limits.
+        Extraction never produces more than the sizes checked here: zip
+        members stop at their declared size and 7z members are read to
+        theirs.
+    """
+    max_files = max_files or settings.WEBGL_ARCHIVE_MAX_FILES
+    max_uncompressed_mb = max_uncompressed_mb or settings.WEBGL_ARCHIVE_MAX_UNCOMPRESSED_MB
+    max_ratio = max_ratio or settings.WEBGL_ARCHIVE_MAX_RATIO
+    file_name = archive_file.name.lower()
+
+    try:
+        if file_name.endswith('.zip'):
+            archive_format, members = 'zip', _zip_directory(archive_file)
+        elif file_name.endswith('.7z'):
+            archive_format, members = '7z', _7z_directory(archive_file)
+        else:
+            raise serializers.ValidationError({'error': 'Unsupported archive format. Use: zip, 7z'})
+    except serializers.ValidationError:
+        raise
+    except Exception:
+        raise serializers.ValidationError({'error': 'Upload a valid zip or 7z archive'})
+    finally:
+        archive_file.seek(0)
+
+    if len(members) > max_files:
+        raise serializers.ValidationError({'error': f'Archive has too many files, maximum is {max_files}'})
+    archive_size = archive_file.size
+    uncompressed = 0
+    for name, size, compressed_size in members:
+        if _unsafe_member_path(name):
+            raise serializers.ValidationError({'error': f'Archive contains an unsafe path: {name[:200]}'})
+        uncompressed += size
+        if compressed_size is not None and size > max(RATIO_CHECK_MIN_BYTES, max_ratio * compressed_size):
+            raise serializers.ValidationError({'error': f'Archive member compresses suspiciously well: {name[:200]}'})
+    if uncompressed > max_uncompressed_mb * 1024 * 1024:
+        raise serializers.ValidationError(
+            {'error': f'Archive expands to more than {max_uncompressed_mb} MB'}
+        )
+    ratio = uncompressed / max(archive_size, 1)
+    if uncompressed > RATIO_CHECK_MIN_BYTES and ratio > max_ratio:
+        raise serializers.ValidationError({'error': 'Archive compresses suspiciously well'})
+    return ArchiveInfo(archive_format, len(members), archive_size, uncompressed, ratio)
+
+
+def _zip_directory(archive_file):
+    """[(name, size, compressed size)] from the central directory; rejects symlinks and overlapping members."""
+    with zipfile.ZipFile(_archive_source(archive_file)) as z:
+        infos = [info for info in z.infolist() if not info.is_dir()]
+    for info in infos:
+        if stat.S_ISLNK(info.external_attr >> 16):
+            raise serializers.ValidationError({'error': f'Archive contains a symlink: {info.filename[:200]}'})
+    # Members that share compressed data let a small archive declare far more
+    # bytes than it holds, so data ranges must not overlap.
+    ordered = sorted(infos, key = lambda info: info.header_offset)
+    for info, following in zip(ordered, ordered[1:]):
+        if info.header_offset + info.compress_size > following.header_offset:
+            raise serializers.ValidationError({'error': 'Archive members overlap'})
+    return [(info.filename, info.file_size, info.compress_size) for info in infos]
+
+
+def _7z_directory(archive_file):
+    """[(name, size, None)] from the 7z header; members of solid blocks have no compressed size of their own."""
+    with _open_7z(archive_file) as archive:
+        return [(entry.filename, entry.uncompressed, None) for entry in archive.list() if not entry.is_directory]
+
+
+def _unsafe_member_path(name):
+    return (
+        not name
+        or name.startswith(('/', '\\'))
+        or '\0' in name
+        or (len(name) > 1 and name[1] == ':')
+        or '..' in re.split(r'[\\/]', name)
+    )
+
+
+def process_webgl_upload(archive_file, game_id, storage = None, manifest = None, progress = None, version = 1):
+    """
+    Extracts a WebGL build archive (zip or 7z) as ``version`` of the game's
+    build, in ``games/{game_id}/v{version}/``. A version directory is never
+    written to again; the previous one stays untouched until it is deleted
+    with delete_build(). Members are uploaded concurrently by
+    upload_webgl_build, which stores most of them once per content in the
+    shared blob store, so with the ``manifest`` of the previous build only
+    new or changed blobs are uploaded.
+
+    ``progress(stage, done, total)`` is called with stage "extracting" before
+    the archive is read and "uploading" as files complete. Returns the
+    upload_webgl_build report with the index.html ``url`` added.
+
+    Large uploads arrive spooled to disk and are read from there: zip members
+    are streamed out of the archive and 7z members are decompressed in one
+    pass, each uploaded while the next ones decompress: into at most
+    WEBGL_7Z_BUFFER_BYTES of memory, or to a temporary file for members
+    larger than half of it (SevenZipMembers). Peak memory is therefore
+    bounded by the upload pool, roughly WEBGL_UPLOAD_MAX_WORKERS x
+    AWS_S3_TRANSFER_CONFIG max_concurrency x multipart_chunksize (8 x 2 x 8 MB
+    = 128 MB with the defaults), plus WEBGL_7Z_BUFFER_BYTES for 7z builds and
+    up to FILE_UPLOAD_MAX_MEMORY_SIZE for an upload small enough to stay in RAM.
+    """
+    if not archive_file:
+        return None
+
+    storage = storage or webgl_storage()
+    webgl_dir = build_dir(game_id, version)
+    file_name = archive_file.name.lower()
+    start = time.perf_counter()
+    if progress:
+        progress('extracting', 0, 0)
+    preflight_archive(archive_file)
+
+    if file_name.endswith('.zip'):
+        with zipfile.ZipFile(_archive_source(archive_file)) as z:
+            members = [
+                (file_info.filename, file_info.file_size, _zip_opener(z, file_info))
+                for file_info in z.infolist() if not file_info.is_dir()
+            ]
+            report = upload_webgl_build(members, webgl_dir, storage, manifest = manifest, progress = progress)
+
+    elif file_name.endswith('.7z'):
+        with _open_7z(archive_file) as archive:
+            members = SevenZipMembers(archive, settings.WEBGL_7Z_BUFFER_BYTES)
+            try:
+                report = upload_webgl_build(members, webgl_dir, storage, manifest = manifest, progress = progress)
+            finally:
+                members.close()
+
+    else:
+        raise ValueError("Unsupported archive format. Only ZIP, and 7Z files are supported.")
+
+    diff = report['diff']
+    logger.info(
+        "WebGL build for game %s: %d files (%d added, %d changed, %d removed, %d unchanged, %d shared blobs), "
+        "%.1f MB uploaded as %.1f MB in %.2fs (%.2fs uploading, %d workers)",
+        game_id, report['files'], len(diff['added']), len(diff['changed']), len(diff['removed']),
+        diff['unchanged'], report['reused'], report['uploaded_bytes'] / (1024 * 1024), report['stored_bytes'] / (1024 * 1024),
+        time.perf_counter() - start, report['seconds'], report['workers'],
+    )
+    report['url'] = storage.url(webgl_dir + "index.html")
+    return report
+
+
+def upload_webgl_build(members, webgl_dir, storage = None, max_workers = None, manifest = None, progress = None):
+    """
+    Uploads ``members``, an iterable of (relative_path, size, opener) triples
+    where opener() returns a readable binary file, for the build in
+    ``webgl_dir``.
+
+    Each file is stored as member_kind() says. Blobs go to blob_key(), where
+    a file some other build already uploaded is not stored again; the rest
+    go below ``webgl_dir``, which is expected to be a new, empty directory.
+    Documents are held back until every blob is in place, then stored with
+    their references rewritten to the blob URLs.
+
+    Uploads run on a thread pool of WEBGL_UPLOAD_MAX_WORKERS, with at most two
+    members per worker open at any time. An opener with a ``release()``
+    method has it called once its member is done, to free what it holds. On
+    storages that take per-object metadata, each file is stored with
+    object_parameters() and, with WEBGL_BROTLI, eligible uncompressed files
+    are Brotli-compressed on the way.
+
+    ``manifest`` is the path map of the previous build: relative paths to
+    {sha256, size} plus the ``blob`` key of shared files. Blobs whose entry
+    matches are not uploaded again. Returns a report with the new
+    ``manifest``, the ``diff`` against the old one and byte counts. ``progress("uploading", done, total)`` is called as
+    files complete; total is 0 when ``members`` has no length.
+    """
+    storage = storage or webgl_storage()
+    max_workers = max_workers or settings.WEBGL_UPLOAD_MAX_WORKERS
+    manifest = manifest or {}
+    total = len(members) if hasattr(members, '__len__') else 0
+    members = iter(members)
+    report = {
+        'files': 0, 'bytes': 0, 'uploaded_bytes': 0, 'stored_bytes': 0, 'reused': 0, 'seconds': 0.0,
+        'workers': max_workers, 'manifest': {}, 'diff': {'added': [], 'changed': [], 'removed': [], 'unchanged': 0},
+    }
+    claimed = _BlobClaims()
+    documents = []
+    start = time.perf_counter()
+
+    def settle(pending, return_when):
+        done, pending = wait(pending, return_when = return_when)
+        _collect(done, report, manifest)
+        if progress:
+            progress('uploading', report['files'], total)
+        return pending
+
+    with ThreadPoolExecutor(max_workers, thread_name_prefix = 'webgl-upload') as executor:
+        try:
+            pending = set()
+            for rel_path, size, opener in members:
+                kind = member_kind(rel_path, size)
+                if kind == 'document':
+                    documents.append((rel_path, _read_member(opener)))
+                    continue
+                pending.add(executor.submit(
+                    _upload_member, storage, webgl_dir, rel_path, size, opener, manifest.get(rel_path),
+                    claimed if kind == 'blob' else None,
+                ))
+                if len(pending) >= max_workers * 2:
+                    pending = settle(pending, FIRST_COMPLETED)
+            while pending:
+                pending = settle(pending, FIRST_COMPLETED)
+
+            urls = {
+                rel_path: storage.url(entry['blob'])
+                for rel_path, entry in report['manifest'].items() if 'blob' in entry
+            }
+            for rel_path, data in documents:
+                pending.add(executor.submit(_upload_document, storage, webgl_dir, rel_path, data, urls))
+            while pending:
+                pending = settle(pending, FIRST_COMPLETED)
+        except BaseException:
+            executor.shutdown(cancel_futures = True)
+            raise
+
+    report['diff']['removed'] = sorted(set(manifest) - set(report['manifest']))
+    report['diff']['added'].sort()
+    report['diff']['changed'].sort()
+    report['seconds'] = time.perf_counter() - start
+    return report
+
+
+def delete_build(game_id, version, storage = None):
+    """
+    Deletes the files of one version of a game's build; blobs are left to
+    purge_blobs(). For version 0 that is everything in games/{game_id}/ but
+    the version directories. Returns the number of files deleted.
+    """
+    storage = storage or webgl_storage()
+    root = build_dir(game_id, version)
+    deleted = 0
+    try:
+        dirs, files = storage.listdir(root)
+    except FileNotFoundError:
+        return 0
+    for file in files:
+        storage.delete(root + file)
+        deleted += 1
+    for directory in dirs:
+        if version == 0 and _VERSION_DIR.fullmatch(directory):
+            continue
+        deleted += _delete_tree(storage, f"{root}{directory}/")
+    return deleted
+
+
+def purge_blobs(referenced, older_than, storage = None, stop = None):
+    """
+    Deletes blobs that are not in ``referenced`` and were last written
+    before ``older_than``, so blobs a build has just uploaded are kept.
+    ``stop()`` is asked before each deletion and ends the sweep when it
+    returns True. Returns the deleted keys.
+    """
+    storage = storage or webgl_storage()
+    location = settings.WEBGL_BLOB_LOCATION
+    try:
+        names = storage.listdir(location)[1]
+    except FileNotFoundError:
+        return []
+    deleted = []
+    for name in names:
+        key = f"{location}/{name}"
+        if key in referenced or storage.get_modified_time(key) >= older_than:
+            continue
+        if stop is not None and stop():
+            break
+        storage.delete(key)
+        deleted.append(key)
+    return deleted
+
+
+def _delete_tree(storage, prefix):
+    dirs, files = storage.listdir(prefix)
+    for file in files:
+        storage.delete(prefix + file)
+    return len(files) + sum(_delete_tree(storage, f"{prefix}{directory}/") for directory in dirs)
+
+
+def _collect(done, report, manifest):
+    for future in done:
+        rel_path, entry, outcome, stored_size = future.result()
+        report['files'] += 1
+        report['bytes'] += entry['size']
+        report['manifest'][rel_path] = entry
+        if entry == manifest.get(rel_path):
+            report['diff']['unchanged'] += 1
+        else:
+            report['diff']['changed' if rel_path in manifest else 'added'].append(rel_path)
+        if outcome == 'unchanged':
+            continue
+        if outcome == 'reused':
+            report['reused'] += 1
+            continue
+        report['uploaded_bytes'] += entry['size']
+        report['stored_bytes'] += stored_size
+
+
+class _BlobClaims:
+    """Blob keys a build has started storing, so duplicate files are uploaded once."""
+
+    def __init__(self):
+        self.keys = set()
+        self.lock = threading.Lock()
+
+    def claim(self, key):
+        with self.lock:
+            if key in self.keys:
+                return False
+            self.keys.add(key)
+            return True
+
+
+def _upload_member(storage, webgl_dir, rel_path, size, opener, known = None, claimed = None):
+    """
+    Hashes one build file and stores it. With ``claimed`` the file is a
+    blob, which is not stored again if ``known`` or the storage says it is
+    already there. Returns (rel_path, manifest entry, "unchanged", "reused"
+    or "stored", stored size).
+    """
+    try:
+        # Openers that saw the bytes go by (SevenZipMembers) already know the hash.
+        entry = {'sha256': getattr(opener, 'sha256', None) or _sha256(opener), 'size': size}
+        if claimed is None:
+            return rel_path, entry, 'stored', _store_member(storage, webgl_dir + rel_path, size, opener)
+        entry['blob'] = blob_key(entry['sha256'], rel_path)
+        if entry == known:
+            return rel_path, entry, 'unchanged', 0
+        if not claimed.claim(entry['blob']) or storage.exists(entry['blob']):
+            return rel_path, entry, 'reused', 0
+        return rel_path, entry, 'stored', _store_member(storage, entry['blob'], size, opener)
+    finally:
+        if hasattr(opener, 'release'):
+            opener.release()
+
+
+def _upload_document(storage, webgl_dir, rel_path, data, urls):
+    """Stores a build document with its references rewritten by rewrite_references()."""
+    text = data.decode('utf-8', 'surrogateescape')
+    rendered = rewrite_references(rel_path, text, urls).encode('utf-8', 'surrogateescape')
+    entry = {'sha256': hashlib.sha256(data).hexdigest(), 'size': len(data)}
+    if rendered != data:
+        entry['rendered'] = hashlib.sha256(rendered).hexdigest()
+    stored_size = _store_member(storage, webgl_dir + rel_path, len(rendered), lambda: io.BytesIO(rendered))
+    return rel_path, entry, 'stored', stored_size
+
+
+def _read_member(opener):
+    try:
+        with opener() as source:
+            return source.read()
+    finally:
+        if hasattr(opener, 'release'):
+            opener.release()
+
+
+def _sha256(opener):
+    digest = hashlib.sha256()
+    with opener() as source:
+        for chunk in iter(lambda: source.read(UPLOAD_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _store_member(storage, path, size, opener):
+    """Stores one build file and returns its stored size."""
+    params = object_parameters(path) if getattr(storage, 'accepts_object_parameters', False) else None
+    if params and _should_compress(path, size, params):
+        with opener() as source:
+            compressed, compressed_size = _brotli_compress(source)
+        if compressed_size < size:
+            params['ContentEncoding'] = 'br'
+            return _save_member(storage, path, compressed, compressed_size, params)
+        compressed.close()
+    return _save_member(storage, path, opener(), size, params)
+
+
+def _save_member(storage, path, source, size, params):
+    with source:
+        content = File(source, name = path)
+        content.size = size
+        content.DEFAULT_CHUNK_SIZE = UPLOAD_CHUNK_SIZE
+        if params:
+            content.object_parameters = params
+        if not _overwrites(storage) and storage.exists(path):
+            storage.delete(path)
+        storage.save(path, content)
+    return size
+
+
+def _should_compress(path, size, params):
+    return (
+        settings.WEBGL_BROTLI
+        and 'ContentEncoding' not in params
+        and size >= BROTLI_MIN_SIZE
+        and posixpath.splitext(path)[1].lower() in BROTLI_EXTENSIONS
+    )
+
+
+def _brotli_compress(source):
+    """Streams ``source`` through Brotli into a temp file that spills to disk past one chunk."""
+    output = tempfile.SpooledTemporaryFile(max_size = UPLOAD_CHUNK_SIZE)
+    compressor = brotli.Compressor(quality = settings.WEBGL_BROTLI_QUALITY)
+    for chunk in iter(lambda: source.read(UPLOAD_CHUNK_SIZE), b''):
+        output.write(compressor.process(chunk))
+    output.write(compressor.finish())
+    size = output.tell()
+    output.seek(0)
+    return output, size
+
+
+def _split_precompressed(path):
+    """Splits a build path into the path of the uncompressed file and its .br/.gz suffix ('' if none)."""
+    for suffix in PRECOMPRESSED_SUFFIXES:
+        if path.lower().endswith(suffix):
+            return path[:-len(suffix)], suffix
+    return path, ''
+
+
+def _overwrites(storage):
+    return getattr(storage, 'file_overwrite', False) or getattr(storage, 'allow_overwrite', False)
+
+
+def _zip_opener(z, file_info):
+    return lambda: z.open(file_info)
+
+
+def _archive_source(archive_file):
+    """
+    Returns the on-disk path of an upload Django spooled to a temporary file
+    (anything above FILE_UPLOAD_MAX_MEMORY_SIZE) or of a game_file kept on a
+    local storage, so the archive is read from disk without another copy;
+    anything else is read through its underlying file object.
+    """
+    if hasattr(archive_file, 'temporary_file_path'):
+        return archive_file.temporary_file_path()
+    try:
+        # A stored game_file on a local filesystem storage.
+        return archive_file.path
+    except (AttributeError, NotImplementedError, ValueError):
+        pass
+    archive_file.seek(0)
+    while hasattr(archive_file, 'file') and not isinstance(archive_file, io.IOBase):
+        archive_file = archive_file.file
+    return archive_file
+
+
+class SevenZipMembers:
+    """
+    The files of an open py7zr archive as upload_webgl_build members,
+    decompressed in a single pass.
+
+    A background thread runs py7zr's extraction with every member written to
+    a _SevenZipSink instead of its path, and each member is handed over to be
+    uploaded as soon as it is complete while the rest decompresses. Members
+    of up to half of ``buffer_bytes`` are kept in memory, and a sink waits
+    before it is written until released members leave room for it, so no
+    more than ``buffer_bytes`` are held at once. Larger members are written
+    to a temporary file in FILE_UPLOAD_TEMP_DIR, deleted once uploaded, so a
+    big .data file neither sits in memory nor stalls the smaller files behind
+    it. Independent solid blocks are decompressed on py7zr's own threads
+    when the archive is read from a path. close() stops the extraction.
+
+    py7zr 0.22 has no public hook for writing members elsewhere (1.0 adds
+    WriterFactory), so the sinks are registered with the archive's extraction
+    worker, as SevenZipFile.read() does with its in-memory buffers.
+    """
+
+    def __init__(self, archive, buffer_bytes):
+        self.archive = archive
+        # Directories, links and special files have no content of their own to upload.
+        self.entries = [
+            entry for entry in archive.files
+            if not (entry.is_directory or entry.is_socket or entry.is_symlink or entry.is_junction)
+        ]
+        self.budget = _ByteBudget(buffer_bytes)
+        self.spooled = []
+        self.spooled_bytes = 0
+        self.thread = None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        ready = queue.Queue()
+        self.thread = threading.Thread(target = self.decompress, args = (ready,), name = 'webgl-7z', daemon = True)
+        self.thread.start()
+        while True:
+            member = ready.get()
+            if member is None:
+                return
+            if isinstance(member, Exception):
+                raise member
+            yield member
+
+    def close(self):
+        self.budget.cancel()
+        if self.thread is not None:
+            self.thread.join()
+        # Members left behind by a failed upload still have their files.
+        for member in self.spooled:
+            member.release()
+
+    def decompress(self, ready):
+        archive = self.archive
+        spool_above = self.budget.limit // 2
+        try:
+            members = {entry.id for entry in self.entries}
+            for entry in archive.files:
+                sink = None
+                if entry.id in members:
+                    size = entry.uncompressed or 0
+                    if size > spool_above:
+                        sink = _SevenZipSink(entry.filename, size, None, ready, self.spooled)
+                        self.spooled_bytes += size
+                    else:
+                        sink = _SevenZipSink(entry.filename, size, self.budget, ready)
+                archive.worker.register_filelike(entry.id, sink)
+            archive.worker.extract(
+                archive.fp, None, parallel = not archive.password_protected and not archive._filePassed,
+            )
+        except _ExtractionCancelled:
+            pass
+        except Exception as e:
+            ready.put(RuntimeError(f"Failed to extract 7z archive: {e}"))
+        finally:
+            ready.put(None)
+
+
+class _ExtractionCancelled(Exception):
+    pass
+
+
+class _SevenZipSink:
+    """
+    Stand-in for the output path of one 7z member, in the shape of py7zr's
+    MemIO. With a ``budget`` the member is written to memory once its size
+    is reserved there, otherwise to a temporary file whose opener is also
+    added to ``spooled``. The member is hashed as it is written, and once
+    py7zr has written and checked it, it is put on ``ready`` with an opener
+    that carries the ``sha256`` and whose release() frees it.
+    """
+
+    def __init__(self, name, size, budget, ready, spooled = None):
+        self.name = name
+        self.size = size
+        self.budget = budget
+        self.ready = ready
+        self.spooled = spooled
+        self.output = None
+        self.digest = None
+
+    @property
+    def parent(self):
+        return self
+
+    def mkdir(self, parents = False, exist_ok = False):
+        pass
+
+    def open(self, mode = None):
+        if self.budget is None:
+            self.output = tempfile.NamedTemporaryFile(
+                dir = settings.FILE_UPLOAD_TEMP_DIR, prefix = 'webgl-', suffix = '.member', delete = False,
+            )
+        elif self.budget.acquire(self.size):
+            self.output = io.BytesIO()
+        else:
+            raise _ExtractionCancelled()
+        self.digest = hashlib.sha256()
+        return self
+
+    def write(self, data):
+        self.digest.update(data)
+        return self.output.write(data)
+
+    def seek(self, position):
+        self.output.seek(position)
+
+    def flush(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        output, self.output = self.output, None
+        if self.budget is None:
+            output.close()
+            member = _SpooledMember(output.name)
+            self.spooled.append(member)
+            size = os.path.getsize(output.name)
+        else:
+            data = output.getvalue()
+            output.close()
+            # The reservation was the declared size; settle it to what was written.
+            self.budget.release(self.size - len(data))
+            member, size = _BufferedMember(data, self.budget), len(data)
+        if exc_type is not None:
+            member.release()
+            return
+        member.sha256 = self.digest.hexdigest()
+        self.ready.put((self.name, size, member))
+
+
+class _BufferedMember:
+    """Opener over a decompressed member; release() hands its bytes back to the budget."""
+    sha256 = None
+
+    def __init__(self, data, budget):
+        self.data = data
+        self.budget = budget
+
+    def __call__(self):
+        return io.BytesIO(self.data)
+
+    def release(self):
+        if self.data is not None:
+            self.budget.release(len(self.data))
+            self.data = None
+
+
+class _SpooledMember:
+    """Opener over a member decompressed to a temporary file; release() deletes the file."""
+    sha256 = None
+
+    def __init__(self, path):
+        self.path = path
+
+    def __call__(self):
+        return open(self.path, 'rb')
+
+    def release(self):
+        if self.path is not None:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+            self.path = None
+
+
+class _ByteBudget:
+    def __init__(self, limit):
+        self.limit = limit
+        self.used = 0
+        self.cancelled = False
+        self.condition = threading.Condition()
+
+    def acquire(self, size):
+        """Waits for room for ``size`` bytes; returns False if cancelled meanwhile."""
+        with self.condition:
+            self.condition.wait_for(lambda: self.cancelled or self.used == 0 or self.used + size <= self.limit)
+            if self.cancelled:
+                return False
+            self.used += size
+            return True
+
+    def release(self, size):
+        with self.condition:
+            self.used -= size
+            self.condition.notify_all()
+
+    def cancel(self):
+        with self.condition:
+            self.cancelled = True
+            self.condition.notify_all()
+
+
+def _open_7z(archive_file):
+    try:
+        import py7zr
+    except ImportError:
+        raise ImportError("The 'py7zr' module is required to process 7z files. Install it with 'pip install py7zr'")
+
+    try:
+        return py7zr.SevenZipFile(_archive_source(archive_file), 'r')
+    except py7zr.Bad7zFile:
+        raise py7zr.Bad7zFile("The uploaded file is not a valid 7z archive or is corrupted.")
+    except Exception as e:
+        raise RuntimeError(f"Failed to extract 7z archive: {e}")
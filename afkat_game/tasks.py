@@ -0,0 +1,226 @@
+# afkat_game/tasks.py
+import logging
+import posixpath
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from celery import shared_task
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import serializers
+
+from afkat_game.models import Game
+from afkat_game.services.webgl_service import delete_build, process_webgl_upload, purge_blobs, webgl_storage
+
+logger = logging.getLogger(__name__)
+
+STAGES = {
+    'extracting': Game.BUILD_EXTRACTING,
+    'uploading': Game.BUILD_UPLOADING,
+}
+PROGRESS_INTERVAL = 1.0
+IN_PROGRESS = (Game.BUILD_QUEUED, Game.BUILD_EXTRACTING, Game.BUILD_UPLOADING)
+
+
+def schedule_game_build(game):
+    """
+    Queues extraction of ``game.game_file`` into its WebGL directory for
+    the Celery worker once the transaction commits. Runs inline when
+    WEBGL_BUILD_ASYNC is off or the archive sits on a local filesystem
+    storage a worker could not read.
+    """
+    Game.objects.filter(pk = game.pk).update(
+        build_status = Game.BUILD_QUEUED, build_progress = 0, build_total = 0, build_error = "", build_diff = {},
+    )
+    game_id, name = game.pk, game.game_file.name
+    if not settings.WEBGL_BUILD_ASYNC or isinstance(game.game_file.storage, FileSystemStorage):
+        return process_game_build(game_id, name)
+    transaction.on_commit(lambda: process_game_build.delay(game_id, name))
+
+
+@shared_task(ignore_result = True)
+def process_game_build(game_id, name):
+    """
+    Extracts ``name`` as a new version of the game's WebGL build. The live
+    version keeps serving until the new one is complete, then moves to
+    retired_builds for purge_retired_builds.
+    """
+    game = Game.objects.filter(pk = game_id).first()
+    if game is None or game.game_file.name != name:
+        # The game was deleted, or a newer build replaced this one while queued.
+        return
+
+    version = _reserve_version(game_id)
+    if version is None:
+        return
+    current = Game.objects.filter(pk = game_id, game_file = name)
+    last_update = 0.0
+
+    def progress(stage, done, total):
+        nonlocal last_update
+        now = time.monotonic()
+        if done and done < total and now - last_update < PROGRESS_INTERVAL:
+            return
+        last_update = now
+        current.update(build_status = STAGES[stage], build_progress = done, build_total = total)
+
+    try:
+        with _local_archive(game.game_file) as archive:
+            build = process_webgl_upload(
+                archive, game_id, manifest = game.build_manifest, progress = progress, version = version
+            )
+    except serializers.ValidationError as e:
+        logger.warning("WebGL build for game %s rejected: %s", game_id, e.detail)
+        error = e.detail.get('error') if isinstance(e.detail, dict) else None
+        current.update(build_status = Game.BUILD_FAILED, build_error = str(error or e))
+        retire_build(game_id, version)
+        return
+    except Exception as e:
+        logger.exception("WebGL build for game %s failed", game_id)
+        current.update(build_status = Game.BUILD_FAILED, build_error = str(e))
+        retire_build(game_id, version)
+        return
+
+    with transaction.atomic():
+        game = current.select_for_update().first()
+        if game is None:
+            # Replaced by a newer upload while extracting.
+            game = Game.objects.select_for_update().filter(pk = game_id).first()
+            if game is not None:
+                game.retired_builds = game.retired_builds + [_retired(version, build['manifest'])]
+                game.save(update_fields = ['retired_builds'])
+            return
+        if game.webgl_index_path:
+            game.retired_builds = game.retired_builds + [_retired(game.build_version, game.build_manifest)]
+        game.build_status = Game.BUILD_READY
+        game.build_version = version
+        game.webgl_index_path = build['url']
+        game.build_manifest = build['manifest']
+        game.build_diff = build['diff']
+        game.build_progress = game.build_total = build['files']
+        game.save(update_fields = [
+            'retired_builds', 'build_status', 'build_version', 'webgl_index_path', 'build_manifest', 'build_diff',
+            'build_progress', 'build_total',
+        ])
+
+
+@contextmanager
+def _local_archive(field_file):
+    """
+    The stored build archive as a file on local disk. Opening an S3 object
+    through the storage would buffer all of it in memory, so it is downloaded
+    into a temporary file in FILE_UPLOAD_TEMP_DIR, deleted afterwards, and
+    read from there like a spooled upload.
+    """
+    storage = field_file.storage
+    if not hasattr(storage, 'bucket_name'):
+        with field_file.open('rb') as archive:
+            yield archive
+        return
+
+    archive = TemporaryUploadedFile(posixpath.basename(field_file.name), 'application/octet-stream', 0, None)
+    try:
+        storage.connection.meta.client.download_fileobj(
+            storage.bucket_name,
+            storage._normalize_name(field_file.name),
+            archive.file,
+            Config = storage.transfer_config,
+        )
+        archive.size = archive.file.tell()
+        archive.seek(0)
+        yield archive
+    finally:
+        archive.close()
+
+
+def _reserve_version(game_id):
+    """Hands out the game's next build version; the row lock keeps concurrent builds from sharing one."""
+    with transaction.atomic():
+        game = Game.objects.select_for_update().filter(pk = game_id).first()
+        if game is None:
+            return None
+        game.build_sequence += 1
+        game.save(update_fields = ['build_sequence'])
+        return game.build_sequence
+
+
+def retire_build(game_id, version, manifest = None):
+    """Marks a version of a game's build as no longer served."""
+    with transaction.atomic():
+        game = Game.objects.select_for_update().filter(pk = game_id).first()
+        if game is None:
+            return
+        game.retired_builds = game.retired_builds + [_retired(version, manifest or {})]
+        game.save(update_fields = ['retired_builds'])
+
+
+def retire_live_build(game):
+    """Takes the game's WebGL build offline, leaving its files to purge_retired_builds."""
+    with transaction.atomic():
+        locked = Game.objects.select_for_update().get(pk = game.pk)
+        if locked.webgl_index_path:
+            locked.retired_builds = locked.retired_builds + [_retired(locked.build_version, locked.build_manifest)]
+        locked.webgl_index_path = None
+        locked.build_manifest = {}
+        locked.build_version = 0
+        locked.save(update_fields = ['retired_builds', 'webgl_index_path', 'build_manifest', 'build_version'])
+
+
+def _retired(version, manifest):
+    return {
+        'version': version,
+        'retired_at': timezone.now().isoformat(),
+        'blobs': sorted({entry['blob'] for entry in manifest.values() if 'blob' in entry}),
+    }
+
+
+def purge_builds(grace = None, storage = None):
+    """
+    Deletes build versions retired more than ``grace`` ago (default
+    WEBGL_BUILD_GRACE_PERIOD), then the blobs no live or recently retired
+    build uses. Returns (versions, files, blobs) deleted.
+
+    A build in progress reuses existing blobs without rewriting them, and
+    they only become referenced once it finishes, so no blob is deleted
+    while any game is building.
+    """
+    storage = storage or webgl_storage()
+    cutoff = timezone.now() - (settings.WEBGL_BUILD_GRACE_PERIOD if grace is None else grace)
+    versions = files = 0
+
+    for game_id, retired in Game.objects.exclude(retired_builds = []).values_list('pk', 'retired_builds'):
+        expired = [entry for entry in retired if datetime.fromisoformat(entry['retired_at']) <= cutoff]
+        if not expired:
+            continue
+        for entry in expired:
+            files += delete_build(game_id, entry['version'], storage)
+        purged = {entry['version'] for entry in expired}
+        with transaction.atomic():
+            game = Game.objects.select_for_update().get(pk = game_id)
+            game.retired_builds = [entry for entry in game.retired_builds if entry['version'] not in purged]
+            game.save(update_fields = ['retired_builds'])
+        versions += len(expired)
+
+    building = Game.objects.filter(build_status__in = IN_PROGRESS)
+    if building.exists():
+        logger.info("Skipping the blob sweep while %d WebGL build(s) are in progress", building.count())
+        return versions, files, 0
+
+    referenced = set()
+    for manifest, retired in Game.objects.values_list('build_manifest', 'retired_builds').iterator():
+        referenced.update(entry['blob'] for entry in manifest.values() if 'blob' in entry)
+        for entry in retired:
+            referenced.update(entry['blobs'])
+    # A build may start after the check above; stop as soon as one does.
+    blobs = purge_blobs(referenced, cutoff, storage, stop = building.exists)
+    return versions, files, len(blobs)
+
+
+@shared_task(ignore_result = True)
+def purge_retired_builds():
+    versions, files, blobs = purge_builds()
+    logger.info("Purged %d retired WebGL builds (%d files) and %d unused blobs", versions, files, blobs)
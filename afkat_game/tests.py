@@ -1,12 +1,31 @@
-from django.test import TestCase
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.test import SimpleTestCase, TestCase, override_settings
 from django.urls import reverse
 from django.contrib.auth import get_user_model
-from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.uploadedfile import SimpleUploadedFile, TemporaryUploadedFile
 from rest_framework.test import APIClient
 from rest_framework import status
 from afkat_game.models import Game, GameComments, GameRating, GameJam, Tags
+from storages.backends.s3boto3 import S3StaticStorage
+
+from afkat.storage_backends import WebGLBuildStorage
+from afkat.utils.counters import flush_counters
+from afkat.utils.direct_upload import start_upload_session
+from afkat_game.services.game_service import validate_game_file
+from afkat_game.services.webgl_service import _ByteBudget, delete_build, preflight_archive, process_webgl_upload
+from rest_framework import serializers
+from afkat_game.tasks import process_game_build, purge_builds, schedule_game_build
+import base64
+import hashlib
+import io
+import json
 import tempfile
 import os
+import zipfile
+from unittest import mock
+import brotli
+import py7zr
 from datetime import timedelta
 from django.utils import timezone
 
@@ -201,12 +220,14 @@ class GameAPIIntegrationTests(TestCase):
         self.game.refresh_from_db()
         self.assertEqual(self.game.rating, 4.0)
     
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
     def test_download_game(self):
         response = self.client.get(self.game_download_url)
         
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response['Content-Disposition'], f'attachment; filename={self.game.game_file.name}')
         
+        flush_counters()
         self.game.refresh_from_db()
         self.assertEqual(self.game.download_count, 1)
 
@@ -409,4 +430,449 @@ class GameJamAPIIntegrationTests(TestCase):
         
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
         self.game_jam.refresh_from_db()
-        self.assertFalse(self.game_jam.submitted_games.filter(id=self.game.id).exists())
\ No newline at end of file
+        self.assertFalse(self.game_jam.submitted_games.filter(id=self.game.id).exists())
+
+class WebGLUploadTests(SimpleTestCase):
+    def setUp(self):
+        self.storage = FileSystemStorage(location=tempfile.mkdtemp(), base_url='/media/')
+
+    def build_zip(self, files, compression=zipfile.ZIP_STORED):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w', compression) as z:
+            for name, data in files.items():
+                z.writestr(name, data)
+        return SimpleUploadedFile('build.zip', buffer.getvalue(), content_type='application/zip')
+
+    def read_stored(self, report, game_id, name, storage=None):
+        entry = report['manifest'][name]
+        with (storage or self.storage).open(entry.get('blob', f'games/{game_id}/v1/{name}')) as stored:
+            return stored.read()
+
+    def test_zip_members_are_uploaded_below_game_directory(self):
+        files = {'index.html': b'<html></html>', 'Build/game.wasm': os.urandom(1024)}
+        files.update({f'StreamingAssets/{index}.bin': os.urandom(64) for index in range(40)})
+
+        report = process_webgl_upload(self.build_zip(files), 7, storage=self.storage)
+
+        self.assertEqual(report["url"], '/media/games/7/v1/index.html')
+        self.assertTrue(self.storage.exists('games/7/v1/StreamingAssets/0.bin'))
+        for name, data in files.items():
+            self.assertEqual(self.read_stored(report, 7, name), data)
+
+    def test_spooled_upload_is_read_from_disk(self):
+        upload = TemporaryUploadedFile('build.7z', 'application/x-7z-compressed', 0, None)
+        with py7zr.SevenZipFile(upload.temporary_file_path(), 'w') as archive:
+            archive.writestr(b'<html></html>', 'index.html')
+            archive.writestr(b'wasm', 'Build/game.wasm')
+        upload.seek(0)
+
+        with mock.patch('shutil.copyfileobj', side_effect=AssertionError('archive copied')):
+            report = process_webgl_upload(upload, 9, storage=self.storage)
+
+        self.assertEqual(report["url"], '/media/games/9/v1/index.html')
+        self.assertEqual(self.read_stored(report, 9, 'Build/game.wasm'), b'wasm')
+
+    @override_settings(WEBGL_7Z_BUFFER_BYTES=4096)
+    def test_7z_members_are_streamed_within_the_buffer(self):
+        files = {'index.html': b'<html></html>', 'Build/game.data': os.urandom(3000)}
+        files.update({f'StreamingAssets/{index}.bin': os.urandom(1000) for index in range(6)})
+        upload = TemporaryUploadedFile('build.7z', 'application/x-7z-compressed', 0, None)
+        with py7zr.SevenZipFile(upload.temporary_file_path(), 'w') as archive:
+            for name, data in files.items():
+                archive.writestr(data, name)
+        upload.seek(0)
+        held = []
+        passes = []
+        acquire = _ByteBudget.acquire
+        extract = py7zr.py7zr.Worker.extract
+
+        def record(budget, size):
+            acquired = acquire(budget, size)
+            held.append(budget.used)
+            return acquired
+
+        def count_passes(worker, *args, **kwargs):
+            passes.append(1)
+            return extract(worker, *args, **kwargs)
+
+        spool_dir = tempfile.mkdtemp()
+
+        with mock.patch.object(_ByteBudget, 'acquire', record), \
+                mock.patch.object(py7zr.py7zr.Worker, 'extract', count_passes), \
+                self.settings(FILE_UPLOAD_TEMP_DIR=spool_dir), \
+                mock.patch('tempfile.NamedTemporaryFile', wraps=tempfile.NamedTemporaryFile) as spool:
+            report = process_webgl_upload(upload, 9, storage=self.storage)
+
+        self.assertEqual(report['files'], len(files))
+        self.assertEqual(len(passes), 1)
+        # game.data is over half the buffer, so it went through a temporary file.
+        self.assertEqual(spool.call_count, 1)
+        self.assertEqual(os.listdir(spool_dir), [])
+        self.assertGreater(len(held), 1)
+        self.assertLessEqual(max(held), 4096)
+        for name, data in files.items():
+            self.assertEqual(self.read_stored(report, 9, name), data)
+            self.assertEqual(report['manifest'][name]['sha256'], hashlib.sha256(data).hexdigest())
+
+    def test_each_version_gets_its_own_directory(self):
+        process_webgl_upload(self.build_zip({'index.html': b'v1'}), 7, storage=self.storage)
+        report = process_webgl_upload(self.build_zip({'index.html': b'v2'}), 7, storage=self.storage, version=2)
+
+        self.assertEqual(report['url'], '/media/games/7/v2/index.html')
+        self.assertEqual(sorted(self.storage.listdir('games/7')[0]), ['v1', 'v2'])
+        for version, data in ((1, b'v1'), (2, b'v2')):
+            with self.storage.open(f'games/7/v{version}/index.html') as stored:
+                self.assertEqual(stored.read(), data)
+
+        self.assertEqual(delete_build(7, 1, self.storage), 1)
+        self.assertEqual(self.storage.listdir('games/7/v1'), ([], []))
+        self.assertTrue(self.storage.exists('games/7/v2/index.html'))
+
+    def test_update_uploads_only_changed_members(self):
+        first = process_webgl_upload(
+            self.build_zip({'index.html': b'index', 'Build/game.js': b'v1', 'Build/game.data': b'data'}),
+            7, storage=self.storage,
+        )
+
+        with mock.patch.object(self.storage, 'save', wraps=self.storage.save) as save:
+            second = process_webgl_upload(
+                self.build_zip({'index.html': b'index', 'Build/game.js': b'v2', 'Build/extra.txt': b'new'}),
+                7, storage=self.storage, manifest=first['manifest'], version=2,
+            )
+
+        self.assertEqual(second['diff'], {
+            'added': ['Build/extra.txt'], 'changed': ['Build/game.js'], 'removed': ['Build/game.data'], 'unchanged': 1,
+        })
+        self.assertEqual(sorted(call.args[0] for call in save.call_args_list), sorted([
+            second['manifest']['Build/extra.txt']['blob'], second['manifest']['Build/game.js']['blob'],
+            'games/7/v2/index.html',
+        ]))
+        self.assertTrue(self.storage.exists(first['manifest']['Build/game.data']['blob']))
+        self.assertEqual(set(second['manifest']), {'index.html', 'Build/game.js', 'Build/extra.txt'})
+        self.assertEqual(second['manifest']['Build/game.js']['size'], 2)
+
+    def test_build_files_get_metadata_and_brotli_on_s3(self):
+        storage = FileSystemStorage(location=tempfile.mkdtemp(), base_url='/media/')
+        storage.accepts_object_parameters = True
+        saved = {}
+        original_save = storage.save
+
+        def save(name, content, **kwargs):
+            saved[name] = dict(content.object_parameters)
+            return original_save(name, content, **kwargs)
+
+        wasm = b'\0asm' + b'\1' * 50000
+        files = {'index.html': b'<html></html>', 'Build/game.wasm': wasm, 'Build/game.data.br': b'brotli'}
+        with mock.patch.object(storage, 'save', side_effect=save):
+            report = process_webgl_upload(self.build_zip(files), 7, storage=storage)
+
+        wasm_key = report['manifest']['Build/game.wasm']['blob']
+        data_key = report['manifest']['Build/game.data.br']['blob']
+        self.assertTrue(wasm_key.endswith('.wasm') and data_key.endswith('.data.br'))
+        self.assertEqual(saved['games/7/v1/index.html']['CacheControl'], 'public, max-age=31536000, immutable')
+        self.assertEqual(saved[wasm_key]['ContentType'], 'application/wasm')
+        self.assertEqual(saved[wasm_key]['ContentEncoding'], 'br')
+        self.assertIn('immutable', saved[wasm_key]['CacheControl'])
+        self.assertEqual(brotli.decompress(self.read_stored(report, 7, 'Build/game.wasm', storage)), wasm)
+        self.assertEqual(saved[data_key]['ContentType'], 'application/octet-stream')
+        self.assertEqual(saved[data_key]['ContentEncoding'], 'br')
+        self.assertEqual(self.read_stored(report, 7, 'Build/game.data.br', storage), b'brotli')
+
+    def test_identical_files_are_shared_between_games(self):
+        framework = b'var Module = {};' * 200
+        index = (
+            b'<link rel="stylesheet" href="TemplateData/style.css">'
+            b'<script>var buildUrl = "Build"; var loaderUrl = buildUrl + "/game.loader.js";'
+            b' var config = {frameworkUrl: buildUrl + "/game.framework.js", streamingAssetsUrl: "StreamingAssets"};'
+            b'</script>'
+        )
+        files = {
+            'index.html': index,
+            'TemplateData/style.css': b'#logo { background: url(logo.png) }',
+            'TemplateData/logo.png': b'png',
+            'Build/game.loader.js': b'loader',
+            'Build/game.framework.js': framework,
+        }
+        first = process_webgl_upload(self.build_zip(files), 7, storage=self.storage)
+
+        with mock.patch.object(self.storage, 'save', wraps=self.storage.save) as save:
+            second = process_webgl_upload(self.build_zip(files), 8, storage=self.storage)
+
+        self.assertEqual(second['reused'], 3)
+        self.assertEqual(sorted(call.args[0] for call in save.call_args_list),
+                         ['games/8/v1/TemplateData/style.css', 'games/8/v1/index.html'])
+        framework_url = self.storage.url(first['manifest']['Build/game.framework.js']['blob'])
+        with self.storage.open('games/8/v1/index.html') as stored:
+            html = stored.read().decode()
+        self.assertIn(f'frameworkUrl: "{framework_url}"', html)
+        self.assertIn(f'var loaderUrl = "{self.storage.url(first["manifest"]["Build/game.loader.js"]["blob"])}"', html)
+        self.assertIn('href="TemplateData/style.css"', html)
+        self.assertIn('streamingAssetsUrl: "StreamingAssets"', html)
+        with self.storage.open('games/8/v1/TemplateData/style.css') as stored:
+            self.assertIn(self.storage.url(first['manifest']['TemplateData/logo.png']['blob']), stored.read().decode())
+
+    def test_webgl_storage_merges_object_parameters(self):
+        content = ContentFile(b'wasm', name='game.wasm')
+        content.object_parameters = {'ContentEncoding': 'br', 'CacheControl': 'no-cache'}
+
+        params = WebGLBuildStorage()._get_write_parameters('games/7/Build/game.wasm', content)
+
+        self.assertEqual(params['ContentType'], 'application/wasm')
+        self.assertEqual(params['ContentEncoding'], 'br')
+        self.assertEqual(params['CacheControl'], 'no-cache')
+
+    def test_preflight_reports_archive_directory(self):
+        info = preflight_archive(self.build_zip({'index.html': b'<html></html>', 'Build/game.wasm': os.urandom(2048)}))
+
+        self.assertEqual(info.format, 'zip')
+        self.assertEqual(info.files, 2)
+        self.assertEqual(info.uncompressed_bytes, 2048 + 13)
+
+    def test_preflight_rejects_compression_bombs(self):
+        upload = self.build_zip(
+            {'index.html': b'<html></html>', 'Build/game.data': bytes(20 * 1024 * 1024)},
+            zipfile.ZIP_DEFLATED,
+        )
+
+        with mock.patch('zipfile.ZipFile.open', side_effect=AssertionError('member decompressed')):
+            with self.assertRaisesMessage(serializers.ValidationError, 'compresses suspiciously well'):
+                preflight_archive(upload)
+
+    def test_preflight_rejects_paths_outside_the_build(self):
+        for name in ('../index.html', 'Build/../../x.js', '/etc/passwd', 'C:/game.wasm', 'Build\\..\\..\\x.js'):
+            with self.subTest(name=name):
+                with self.assertRaisesMessage(serializers.ValidationError, 'unsafe path'):
+                    preflight_archive(self.build_zip({'index.html': b'<html></html>', name: b'x'}))
+
+    def test_preflight_rejects_overlapping_members(self):
+        data = bytearray(self.build_zip({'a.bin': os.urandom(4096), 'b.bin': os.urandom(4096)}).read())
+        # Point the second central directory entry at the first member's data.
+        second = data.index(b'PK\x01\x02', data.index(b'PK\x01\x02') + 1)
+        data[second + 42:second + 46] = bytes(4)
+
+        with self.assertRaisesMessage(serializers.ValidationError, 'overlap'):
+            preflight_archive(SimpleUploadedFile('build.zip', bytes(data)))
+
+
+@override_settings(
+    MEDIA_ROOT=tempfile.mkdtemp(),
+    STORAGES={
+        "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+        "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+    },
+)
+class GameBuildTaskTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser1',
+            email='test1@example.com',
+            password='StrongPassword123!'
+        )
+
+    def create_game(self, game_file):
+        return Game.objects.create(title='Test Game', description='desc', creator=self.user, game_file=game_file)
+
+    def test_build_runs_inline_and_reports_ready(self):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w') as z:
+            z.writestr('index.html', b'<html></html>')
+            z.writestr('Build/game.wasm', b'wasm')
+        game = self.create_game(SimpleUploadedFile('build.zip', buffer.getvalue()))
+
+        schedule_game_build(game)
+
+        response = self.client.get(reverse('afkat_game_api:game-build-status', kwargs={'pk': game.pk}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['status'], Game.BUILD_READY)
+        self.assertEqual((response.data['progress'], response.data['total']), (2, 2))
+        self.assertTrue(response.data['webgl_index_path'].endswith(f'games/{game.pk}/v1/index.html'))
+        self.assertEqual(sorted(response.data['diff']['added']), ['Build/game.wasm', 'index.html'])
+
+    def test_rebuild_retires_previous_version_until_purged(self):
+        def build_zip(wasm):
+            buffer = io.BytesIO()
+            with zipfile.ZipFile(buffer, 'w') as z:
+                z.writestr('index.html', b'<html></html>')
+                z.writestr('Build/game.wasm', wasm)
+            return SimpleUploadedFile('build.zip', buffer.getvalue())
+
+        game = self.create_game(build_zip(b'wasm v1'))
+        schedule_game_build(game)
+        game.refresh_from_db()
+        old_blob = game.build_manifest['Build/game.wasm']['blob']
+        game.game_file = build_zip(b'wasm v2')
+        game.save()
+        schedule_game_build(game)
+
+        game.refresh_from_db()
+        self.assertEqual(game.build_version, 2)
+        self.assertTrue(game.webgl_index_path.endswith(f'games/{game.pk}/v2/index.html'))
+        self.assertEqual([entry['version'] for entry in game.retired_builds], [1])
+        self.assertEqual(purge_builds(), (0, 0, 0))
+        self.assertTrue(default_storage.exists(f'games/{game.pk}/v1/index.html'))
+
+        self.assertEqual(purge_builds(grace=timedelta(0))[:2], (1, 1))
+        game.refresh_from_db()
+        self.assertEqual(game.retired_builds, [])
+        self.assertFalse(default_storage.exists(f'games/{game.pk}/v1/index.html'))
+        self.assertFalse(default_storage.exists(old_blob))
+        self.assertTrue(default_storage.exists(game.build_manifest['Build/game.wasm']['blob']))
+        self.assertTrue(default_storage.exists(f'games/{game.pk}/v2/index.html'))
+
+    def test_blobs_are_kept_while_a_build_is_in_progress(self):
+        default_storage.save('blobs/unused.wasm', ContentFile(b'old'))
+        building = self.create_game(None)
+        Game.objects.filter(pk=building.pk).update(build_status=Game.BUILD_UPLOADING)
+
+        self.assertEqual(purge_builds(grace=timedelta(0)), (0, 0, 0))
+        self.assertTrue(default_storage.exists('blobs/unused.wasm'))
+
+        Game.objects.filter(pk=building.pk).update(build_status=Game.BUILD_READY)
+        purge_builds(grace=timedelta(0))
+        self.assertFalse(default_storage.exists('blobs/unused.wasm'))
+
+    def test_s3_archive_is_built_from_a_temporary_file(self):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w') as z:
+            z.writestr('index.html', b'<html></html>')
+        game = self.create_game(SimpleUploadedFile('build.zip', buffer.getvalue()))
+        s3_storage = S3StaticStorage(bucket_name='games-bucket')
+        spool_dir = tempfile.mkdtemp()
+        archives = []
+
+        def download(bucket, key, fileobj, Config=None):
+            self.assertEqual((bucket, key), ('games-bucket', game.game_file.name))
+            fileobj.write(buffer.getvalue())
+
+        def record(archive, *args, **kwargs):
+            archives.append((archive.temporary_file_path(), os.path.exists(archive.temporary_file_path())))
+            return process_webgl_upload(archive, *args, **kwargs)
+
+        with mock.patch.object(Game._meta.get_field('game_file'), 'storage', s3_storage), \
+                mock.patch.object(s3_storage.connection.meta.client, 'download_fileobj', side_effect=download), \
+                mock.patch.object(s3_storage, 'open', side_effect=AssertionError('archive read into memory')), \
+                mock.patch('afkat_game.tasks.process_webgl_upload', side_effect=record), \
+                self.settings(FILE_UPLOAD_TEMP_DIR=spool_dir):
+            process_game_build(game.pk, game.game_file.name)
+
+        game.refresh_from_db()
+        self.assertEqual(game.build_status, Game.BUILD_READY)
+        self.assertEqual(len(archives), 1)
+        path, existed = archives[0]
+        self.assertEqual((os.path.dirname(path), existed), (spool_dir, True))
+        self.assertEqual(os.listdir(spool_dir), [])
+
+    @override_settings(WEBGL_BUILD_ASYNC=True)
+    def test_s3_build_is_queued_for_the_worker(self):
+        game = self.create_game(SimpleUploadedFile('build.zip', b'zip'))
+
+        with mock.patch.object(Game._meta.get_field('game_file'), 'storage', S3StaticStorage(bucket_name='games-bucket')), \
+                mock.patch.object(process_game_build, 'delay') as delay, \
+                self.captureOnCommitCallbacks(execute=True):
+            schedule_game_build(Game.objects.get(pk=game.pk))
+
+        delay.assert_called_once_with(game.pk, game.game_file.name)
+        game.refresh_from_db()
+        self.assertEqual(game.build_status, Game.BUILD_QUEUED)
+
+    def test_broken_archive_marks_build_failed(self):
+        game = self.create_game(SimpleUploadedFile('build.zip', b'not a zip'))
+
+        schedule_game_build(game)
+
+        game.refresh_from_db()
+        self.assertEqual(game.build_status, Game.BUILD_FAILED)
+        self.assertTrue(game.build_error)
+        self.assertIsNone(game.webgl_index_path)
+
+    def test_direct_upload_session_attaches_file_and_builds(self):
+        game = self.create_game(None)
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w') as z:
+            z.writestr('index.html', b'<html></html>')
+        self.client.force_authenticate(user=self.user)
+
+        response = self.client.post(
+            reverse('afkat_game_api:game-upload-session', kwargs={'pk': game.pk}),
+            {'field': 'game_file', 'filename': 'build.zip', 'size': len(buffer.getvalue())},
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        upload = response.data['upload']
+        self.assertEqual(upload['method'], 'PUT')
+
+        put = self.client.put(upload['url'], buffer.getvalue(), content_type='application/octet-stream')
+        self.assertEqual(put.status_code, 204)
+
+        response = self.client.post(
+            reverse('afkat_game_api:game-finalize-upload', kwargs={'pk': game.pk}),
+            {'token': response.data['token']},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        game.refresh_from_db()
+        self.assertTrue(game.game_file.name.endswith('/build.zip'))
+        self.assertEqual(game.build_status, Game.BUILD_READY)
+
+    def test_resumable_upload_continues_from_reported_offset(self):
+        game = self.create_game(None)
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w') as z:
+            z.writestr('index.html', b'<html></html>')
+        data = buffer.getvalue()
+        self.client.force_authenticate(user=self.user)
+
+        session = self.client.post(
+            reverse('afkat_game_api:game-upload-session', kwargs={'pk': game.pk}),
+            {'field': 'game_file', 'filename': 'build.zip', 'size': len(data), 'resumable': True},
+            format='json',
+        ).data
+        upload = session['upload']
+        self.assertEqual(upload['method'], 'PATCH')
+        finalize_url = reverse('afkat_game_api:game-finalize-upload', kwargs={'pk': game.pk})
+
+        first = self.client.patch(upload['url'], data[:40], content_type='application/offset+octet-stream',
+                                  HTTP_UPLOAD_OFFSET='0')
+        self.assertEqual((first.status_code, first['Upload-Offset']), (204, '40'))
+        stale = self.client.patch(upload['url'], data[:40], content_type='application/offset+octet-stream',
+                                  HTTP_UPLOAD_OFFSET='0')
+        self.assertEqual((stale.status_code, stale['Upload-Offset']), (409, '40'))
+        incomplete = self.client.post(finalize_url, {'token': session['token']})
+        self.assertEqual(incomplete.status_code, status.HTTP_400_BAD_REQUEST)
+
+        head = self.client.head(upload['url'])
+        self.assertEqual((head['Upload-Offset'], head['Upload-Length']), ('40', str(len(data))))
+        offset = int(head['Upload-Offset'])
+        rest = self.client.patch(upload['url'], data[offset:], content_type='application/offset+octet-stream',
+                                 HTTP_UPLOAD_OFFSET=str(offset))
+        self.assertEqual(rest['Upload-Offset'], str(len(data)))
+
+        response = self.client.post(finalize_url, {'token': session['token']})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        game.refresh_from_db()
+        self.assertEqual(game.game_file.read(), data)
+        self.assertEqual(game.build_status, Game.BUILD_READY)
+
+    def test_direct_upload_session_rejects_bad_extension(self):
+        game = self.create_game(None)
+        self.client.force_authenticate(user=self.user)
+
+        response = self.client.post(
+            reverse('afkat_game_api:game-upload-session', kwargs={'pk': game.pk}),
+            {'field': 'game_file', 'filename': 'build.exe', 'size': 10},
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_s3_upload_session_is_a_size_capped_presigned_post(self):
+        game = self.create_game(None)
+        s3_storage = S3StaticStorage(bucket_name='games-bucket', default_acl='public-read')
+
+        with mock.patch.object(Game._meta.get_field('game_file'), 'storage', s3_storage):
+            session = start_upload_session(game, 'game_file', 'build.zip', 2048, validate_game_file)
+
+        upload = session['upload']
+        self.assertEqual(upload['method'], 'POST')
+        self.assertIn('games-bucket', upload['url'])
+        self.assertEqual(upload['fields']['key'], session['key'])
+        policy = json.loads(base64.b64decode(upload['fields']['policy']))
+        self.assertIn(['content-length-range', 1, 2048], policy['conditions'])
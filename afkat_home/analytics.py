@@ -0,0 +1,152 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.db.models import Sum
+from django.dispatch import receiver
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+from afkat.utils.counters import counters_flushed
+from afkat_home.models import ActivityRollup
+
+# Counter fields (afkat.utils.counters) whose flushed deltas are also rolled up.
+COUNTER_EVENTS = {
+    "download_count": ActivityRollup.DOWNLOAD,
+    "play_count": ActivityRollup.PLAY,
+}
+BATCH_SIZE = 500
+
+
+def record_events(model, event, counts, day=None):
+    """
+    Adds {object_id: count} to the ``event`` rollups of ``model`` for ``day``
+    (today, UTC) with one INSERT ... ON CONFLICT DO UPDATE per batch, so
+    concurrent writers add to the same row instead of racing to create it.
+    """
+    rows = [(object_id, count) for object_id, count in counts.items() if count]
+    if not rows:
+        return
+    content_type = ContentType.objects.get_for_model(model)
+    day = day or timezone.now().date()
+    table = connection.ops.quote_name(ActivityRollup._meta.db_table)
+    for start in range(0, len(rows), BATCH_SIZE):
+        batch = rows[start:start + BATCH_SIZE]
+        params = []
+        for object_id, count in batch:
+            params += [content_type.pk, object_id, event, day, count]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} (content_type_id, object_id, event, bucket, count) "
+                f"VALUES {', '.join(['(%s, %s, %s, %s, %s)'] * len(batch))} "
+                f"ON CONFLICT (content_type_id, object_id, event, bucket) "
+                f"DO UPDATE SET count = {table}.count + excluded.count",
+                params,
+            )
+
+
+@receiver(counters_flushed)
+def roll_up_flushed_counts(sender, field, deltas, **kwargs):
+    event = COUNTER_EVENTS.get(field)
+    if event is not None:
+        record_events(sender, event, deltas)
+
+
+def _window(days):
+    today = timezone.now().date()
+    return today - timedelta(days=days - 1), today
+
+
+def time_series(instance, event, days=30):
+    """[(day, count)] of ``instance``'s ``event`` for the last ``days`` days, oldest first, zeros included."""
+    start, end = _window(days)
+    counts = dict(
+        ActivityRollup.objects.filter(
+            content_type=ContentType.objects.get_for_model(instance),
+            object_id=instance.pk,
+            event=event,
+            bucket__range=(start, end),
+        ).values_list("bucket", "count")
+    )
+    return [(start + timedelta(days=offset), counts.get(start + timedelta(days=offset), 0)) for offset in range(days)]
+
+
+def top(model, event, days=7, limit=10):
+    """[(object_id, count)] of the ``limit`` objects of ``model`` with the most ``event`` in the last ``days`` days."""
+    start, end = _window(days)
+    return list(
+        ActivityRollup.objects.filter(
+            content_type=ContentType.objects.get_for_model(model),
+            event=event,
+            bucket__range=(start, end),
+        )
+        .values("object_id")
+        .annotate(total=Sum("count"))
+        .order_by("-total", "object_id")
+        .values_list("object_id", "total")[:limit]
+    )
+
+
+def purge_rollups(keep_days=None):
+    """Deletes rollups older than ANALYTICS_RETENTION_DAYS; returns how many."""
+    keep_days = keep_days or settings.ANALYTICS_RETENTION_DAYS
+    deleted, _ = ActivityRollup.objects.filter(bucket__lt=_window(keep_days)[0]).delete()
+    return deleted
+
+
+class AnalyticsMixin:
+    """
+    ViewSet actions over the activity rollups:
+
+        GET {id}/stats/?event=download&days=30     daily counts of one item
+        GET trending/?event=download&days=7&limit=10
+
+    ``analytics_events`` lists the events the model records.
+    """
+    analytics_events = (ActivityRollup.DOWNLOAD,)
+
+    def analytics_params(self, request, default_days):
+        event = request.query_params.get("event", self.analytics_events[0])
+        if event not in self.analytics_events:
+            raise serializers.ValidationError(
+                {"error": f'event must be one of: {", ".join(self.analytics_events)}'}
+            )
+        try:
+            days = int(request.query_params.get("days", default_days))
+        except ValueError:
+            raise serializers.ValidationError({"error": "days must be a number"})
+        if not 1 <= days <= settings.ANALYTICS_RETENTION_DAYS:
+            raise serializers.ValidationError(
+                {"error": f"days must be between 1 and {settings.ANALYTICS_RETENTION_DAYS}"}
+            )
+        return event, days
+
+    @action(detail=True, methods=["get"], url_path="stats")
+    def stats(self, request, pk=None):
+        instance = self.get_object()
+        event, days = self.analytics_params(request, 30)
+        series = time_series(instance, event, days)
+        return Response({
+            "event": event,
+            "days": days,
+            "total": sum(count for day, count in series),
+            "series": [{"date": day, "count": count} for day, count in series],
+        })
+
+    @action(detail=False, methods=["get"], url_path="trending")
+    def trending(self, request):
+        event, days = self.analytics_params(request, 7)
+        try:
+            limit = min(max(int(request.query_params.get("limit", 10)), 1), 50)
+        except ValueError:
+            raise serializers.ValidationError({"error": "limit must be a number"})
+
+        ranking = top(self.get_queryset().model, event, days, limit)
+        objects = self.get_queryset().in_bulk([object_id for object_id, total in ranking])
+        ranking = [(objects[object_id], total) for object_id, total in ranking if object_id in objects]
+        data = self.get_serializer([instance for instance, total in ranking], many=True).data
+        results = [{**item, "window_count": total} for item, (instance, total) in zip(data, ranking)]
+        return Response({"event": event, "days": days, "results": results})
@@ -3,7 +3,8 @@ from rest_framework import serializers
 from rest_framework.decorators import permission_classes
 from rest_framework.permissions import IsAdminUser
 
-from afkat.utils.serializer_field import CompressedImageField
+from afkat.utils.serializer_field import CompressedImageField, ImageVariantsField, MediaPipelineMixin, \
+    NegotiatedImageField
 from afkat_auth.models import (
     User, Follow,
 )
@@ -35,7 +36,7 @@ class CommentSerializer(serializers.ModelSerializer):
         readonly = ["modified_at", "created_at"]
 
 
-class PostSerializer(serializers.ModelSerializer):
+class PostSerializer(MediaPipelineMixin, serializers.ModelSerializer):
     # author = AuthorSerializer(read_only=True)
     username = serializers.ReadOnlyField(source = "author.username")
     user_id = serializers.ReadOnlyField(source = "author.id")
@@ -54,6 +55,8 @@ class PostSerializer(serializers.ModelSerializer):
         required = False,
         allow_null = True,
     )
+    image_variants = ImageVariantsField()
+    image_src = NegotiatedImageField(source = "image")
 
     class Meta:
         model = Post
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class AfkatHomeConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'afkat_home'
+
+    def ready(self):
+        # Connects the receiver that rolls flushed counters up into ActivityRollup.
+        from . import analytics  # noqa: F401
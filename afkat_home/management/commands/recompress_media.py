@@ -0,0 +1,205 @@
+import json
+import posixpath
+
+from django.apps import apps
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand
+from django.db import models
+from django.utils.module_loading import import_string
+
+from afkat.utils.image_batch import compress_images_batch
+from afkat.utils.image_store import discard_image, is_content_addressed, store_image
+from afkat.utils.image_variants import variant_names
+from afkat.utils.media_pipeline import has_variants_field, process_image_field, variants_field_name
+from afkat.utils.serializer_field import CompressedImageField
+
+APP_LABELS = ["afkat_home", "afkat_auth", "afkat_game", "afkat_art"]
+
+# The serializer field whose compression settings apply to each ImageField.
+# Fields missing here use CompressedImageField's defaults.
+FIELD_SERIALIZERS = {
+    ("afkat_home.Post", "image"): ("afkat_home.api.serializers.PostSerializer", "image"),
+    ("afkat_auth.Profile", "profile_image"): ("afkat_auth.serializers.ProfileSerializer", "profile_image"),
+    ("afkat_game.Game", "thumbnail"): ("afkat_game.api.serializers.GameDetailSerializer", "thumbnail"),
+    ("afkat_game.GameJam", "game_jam_thumbnail"): (
+        "afkat_game.api.serializers.GameJamSerializer", "game_jam_thumbnail"
+    ),
+    ("afkat_art.ArtModel", "thumbnail"): ("afkat_art.api.serializers.ArtSerializer", "thumbnail"),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompresses stored images (including default_images placeholders) with the "
+        "current CompressedImageField settings, keeping a result only when it is smaller."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Report the bytes that would be saved, write nothing")
+        parser.add_argument(
+            "--checkpoint",
+            help="JSON-lines file of finished images; rerunning with it skips them",
+        )
+        parser.add_argument("--workers", type=int, default=None, help="Compression processes")
+
+    def handle(self, *args, dry_run=False, checkpoint=None, workers=None, **options):
+        done = self.load_checkpoint(checkpoint)
+        images = self.collect_images()
+        log = open(checkpoint, "a") if checkpoint else None
+
+        totals = {"images": 0, "before": 0, "after": 0, "written": 0, "errors": 0, "skipped": 0}
+        try:
+            for compression_options, names in self.group_by_options(images).items():
+                pending = [name for name in names if name not in done]
+                totals["skipped"] += len(names) - len(pending)
+                for entry in self.recompress(pending, images, json.loads(compression_options), dry_run, workers):
+                    if log:
+                        log.write(json.dumps(entry) + "\n")
+                        log.flush()
+                    if "error" in entry:
+                        totals["errors"] += 1
+                        self.stderr.write(f"{entry['name']}: {entry['error']}")
+                        continue
+                    totals["images"] += 1
+                    totals["before"] += entry["before"]
+                    totals["after"] += min(entry["before"], entry["after"])
+                    totals["written"] += entry["written"]
+        finally:
+            if log:
+                log.close()
+
+        saved = totals["before"] - totals["after"]
+        verb = "Would save" if dry_run else "Saved"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {saved / 1024:.0f} KB over {totals['images']} image(s) "
+            f"({totals['before'] / 1024:.0f} KB -> {totals['after'] / 1024:.0f} KB); "
+            f"{totals['written']} rewritten, {totals['errors']} failed, {totals['skipped']} skipped from checkpoint"
+        ))
+
+    def load_checkpoint(self, checkpoint):
+        """Names of finished images, both as found and as rewritten, so neither is compressed again."""
+        done = set()
+        try:
+            with open(checkpoint or "") as log:
+                for line in log:
+                    entry = json.loads(line)
+                    if "error" not in entry:
+                        done.add(entry["name"])
+                        if entry.get("new_name"):
+                            done.add(entry["new_name"])
+        except FileNotFoundError:
+            pass
+        return done
+
+    def collect_images(self):
+        """Returns {name: {"refs": [(model, field_name)], "options": {...}, "storage": storage}}."""
+        images = {}
+        for app_label in APP_LABELS:
+            for model in apps.get_app_config(app_label).get_models():
+                for field in model._meta.get_fields():
+                    if not isinstance(field, models.ImageField):
+                        continue
+                    options = self.compression_options(model, field.name)
+                    names = (
+                        model.objects.exclude(**{field.name: ""})
+                        .exclude(**{f"{field.name}__isnull": True})
+                        .values_list(field.name, flat=True)
+                        .distinct()
+                    )
+                    for name in names.iterator():
+                        image = images.setdefault(name, {"refs": [], "options": options, "storage": field.storage})
+                        image["refs"].append((model, field.name))
+        return images
+
+    def compression_options(self, model, field_name):
+        target = FIELD_SERIALIZERS.get((model._meta.label, field_name))
+        if target is None:
+            return CompressedImageField().compression_options
+        serializer_path, serializer_field = target
+        return import_string(serializer_path)().fields[serializer_field].compression_options
+
+    def group_by_options(self, images):
+        groups = {}
+        for name, image in images.items():
+            groups.setdefault(json.dumps(image["options"], sort_keys=True), []).append(name)
+        return groups
+
+    def recompress(self, names, images, compression_options, dry_run, workers):
+        """Yields one checkpoint entry per image, compressing up to ``workers`` at a time."""
+        read = []
+        errors = []
+
+        def sources():
+            for name in names:
+                try:
+                    with images[name]["storage"].open(name, "rb") as source:
+                        data = source.read()
+                except Exception as exc:
+                    errors.append({"name": name, "error": str(exc)})
+                    continue
+                read.append((name, len(data)))
+                yield ContentFile(data, name=name)
+
+        results = compress_images_batch(
+            sources(), ordered=False, max_workers=workers, return_exceptions=True, **compression_options
+        )
+        for index, result in results:
+            while errors:
+                yield errors.pop()
+            name, before = read[index]
+            if isinstance(result, Exception):
+                yield {"name": name, "error": str(result)}
+                continue
+            written = not dry_run and result.size < before
+            new_name = self.write_back(name, images[name], result) if written else name
+            yield {"name": name, "before": before, "after": result.size, "written": written, "new_name": new_name}
+        yield from errors
+
+    def write_back(self, name, image, compressed):
+        """
+        Stores ``compressed`` in place of ``name`` and repoints every row that
+        referenced it. Storages that overwrite (S3) keep the same key; otherwise
+        the old file and its responsive variants are removed, unless the file
+        is still some field's default. Repointed rows get their variants
+        cleared and regenerated by the media pipeline.
+        """
+        storage = image["storage"]
+        stem, _ = posixpath.splitext(name)
+        new_ext = posixpath.splitext(compressed.name)[1]
+        if is_content_addressed(name):
+            new_name = store_image(compressed, storage)
+        else:
+            new_name = storage.save(f"{stem}{new_ext}", compressed)
+
+        if new_name == name:
+            return name
+        variants = self.stored_variants(name, image["refs"])
+        for model, field_name in image["refs"]:
+            changes = {field_name: new_name}
+            if has_variants_field(model, field_name):
+                changes[variants_field_name(field_name)] = {}
+            model.objects.filter(**{field_name: name}).update(**changes)
+        defaults = {model._meta.get_field(field_name).default for model, field_name in image["refs"]}
+        if is_content_addressed(name) or name not in defaults:
+            discard_image(storage, name, variants)
+        else:
+            for variant in variant_names(variants):
+                storage.delete(variant)
+
+        for model, field_name in image["refs"]:
+            if has_variants_field(model, field_name):
+                for instance in model.objects.filter(**{field_name: new_name}).iterator():
+                    process_image_field(instance, field_name)
+        return new_name
+
+    def stored_variants(self, name, refs):
+        """The {format: {width: name}} variants rows keep for ``name``, merged over its fields."""
+        variants = {}
+        for model, field_name in refs:
+            if not has_variants_field(model, field_name):
+                continue
+            rows = model.objects.filter(**{field_name: name}).values_list(variants_field_name(field_name), flat=True)
+            for row in rows.iterator():
+                for img_format, names in (row or {}).items():
+                    variants.setdefault(img_format, {}).update(names)
+        return variants
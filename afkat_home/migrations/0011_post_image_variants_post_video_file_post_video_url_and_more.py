@@ -0,0 +1,38 @@
+# Generated by Django 5.2 on 2026-10-18 05:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('afkat_home', '0010_post_likes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='video_file',
+            field=models.FileField(blank=True, null=True, upload_to='post_videos/'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='video_url',
+            field=models.URLField(blank=True, help_text='URL for embedded videos (YouTube, Vimeo, etc.)', max_length=255, null=True),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='content',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='summary',
+            field=models.TextField(blank=True, max_length=500, null=True),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2 on 2026-10-18 06:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('afkat_home', '0011_post_image_variants_post_video_file_post_video_url_and_more'),
+        ('contenttypes', '0002_remove_content_type_name'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_id', models.PositiveIntegerField()),
+                ('event', models.CharField(choices=[('download', 'Download'), ('play', 'Play')], max_length=10)),
+                ('bucket', models.DateField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contenttypes.contenttype')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['content_type', 'event', 'bucket'], name='activity_rollup_window')],
+                'constraints': [models.UniqueConstraint(fields=('content_type', 'object_id', 'event', 'bucket'), name='unique_activity_rollup')],
+            },
+        ),
+    ]
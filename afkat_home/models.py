@@ -31,6 +31,7 @@ class Post(models.Model):
     summary = models.TextField(max_length=500, null=True , blank=True)
     content = models.TextField(null=True , blank=True)
     image = models.ImageField(upload_to="post_images/", null=True, blank=True)
+    image_variants = models.JSONField(default=dict, blank=True)
     theme = models.CharField(max_length=100, null=True, blank=True)
     comments = GenericRelation(Comment)
     video_file = models.FileField(upload_to = "post_videos/", null = True, blank = True)
@@ -58,3 +59,38 @@ class Post(models.Model):
 
     def get_absolute_url(self):
         return reverse("afkat_home_api:post-detail", kwargs={"pk": self.pk})
+
+
+class ActivityRollup(models.Model):
+    """
+    Events of one kind (downloads, plays) for a game or art piece, summed per
+    UTC day. Rows are only ever added to through afkat_home.analytics, so a
+    year of history is at most 365 small rows per item and event.
+    """
+
+    DOWNLOAD = "download"
+    PLAY = "play"
+    EVENT_CHOICES = (
+        (DOWNLOAD, "Download"),
+        (PLAY, "Play"),
+    )
+
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.PositiveIntegerField()
+    content_object = GenericForeignKey("content_type", "object_id")
+    event = models.CharField(max_length=10, choices=EVENT_CHOICES)
+    bucket = models.DateField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["content_type", "object_id", "event", "bucket"], name="unique_activity_rollup"
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["content_type", "event", "bucket"], name="activity_rollup_window"),
+        ]
+
+    def __str__(self):
+        return f"{self.count} {self.event}(s) of {self.content_type.model} {self.object_id} on {self.bucket}"
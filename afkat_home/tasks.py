@@ -0,0 +1,8 @@
+from celery import shared_task
+
+from afkat_home.analytics import purge_rollups
+
+
+@shared_task(ignore_result=True)
+def purge_activity_rollups():
+    purge_rollups()
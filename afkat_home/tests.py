@@ -1,14 +1,25 @@
 
-from django.test import TestCase
+from django.core.management import call_command
+from django.test import TestCase, override_settings
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from rest_framework.test import APIClient
 from rest_framework import status
-from afkat_home.models import Post, Comment
+from afkat.utils import counters
+from afkat.utils.counters import flush_counters, increment
+from afkat.utils.image_variants import variant_names
+from afkat.utils.tasks import process_uploaded_image
+from afkat_game.models import Game
+from afkat_home.analytics import record_events, time_series, top
+from afkat_home.models import ActivityRollup, Post, Comment
+from datetime import timedelta
 from django.core.files.uploadedfile import SimpleUploadedFile
+import io
 import tempfile
 import os
+from unittest import mock
+from PIL import Image
 
 User = get_user_model()
 
@@ -331,3 +342,134 @@ class PostAPITests(TestCase):
 
         self.post.refresh_from_db()
         self.assertFalse(self.post.likes.filter(id=self.user.id).exists())
+
+
+@override_settings(
+    MEDIA_ROOT=tempfile.mkdtemp(),
+    STORAGES={
+        "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+        "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+    },
+)
+class RecompressMediaCommandTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='StrongPassword123!'
+        )
+        buffer = io.BytesIO()
+        Image.linear_gradient('L').resize((2400, 1600)).convert('RGB').save(buffer, format='PNG')
+        self.post = Post.objects.create(
+            title='Test Post',
+            slug='test-post',
+            author=self.user,
+            image=SimpleUploadedFile('large.png', buffer.getvalue(), content_type='image/png'),
+        )
+        self.checkpoint = os.path.join(tempfile.mkdtemp(), 'recompress.jsonl')
+
+    def recompress(self, *args):
+        output = io.StringIO()
+        call_command('recompress_media', '--workers', '1', '--checkpoint', self.checkpoint, *args, stdout=output, stderr=io.StringIO())
+        return output.getvalue()
+
+    def test_dry_run_reports_savings_without_writing(self):
+        original = self.post.image.name
+
+        output = self.recompress('--dry-run')
+
+        self.assertIn('Would save', output)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.image.name, original)
+
+    def test_rewrites_smaller_images_and_resumes_from_checkpoint(self):
+        original = self.post.image.name
+        original_size = self.post.image.size
+
+        self.recompress()
+
+        self.post.refresh_from_db()
+        self.assertNotEqual(self.post.image.name, original)
+        self.assertLess(self.post.image.size, original_size)
+        self.assertFalse(self.post.image.storage.exists(original))
+        rewritten = self.post.image.name
+        rerun = self.recompress()
+        self.assertIn('over 0 image(s)', rerun)
+        self.assertIn('1 skipped from checkpoint', rerun)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.image.name, rewritten)
+
+    def test_rewriting_an_image_drops_its_variants(self):
+        process_uploaded_image('afkat_home.Post', self.post.pk, 'image', self.post.image.name)
+        self.post.refresh_from_db()
+        variants = variant_names(self.post.image_variants)
+        self.assertTrue(variants)
+
+        self.recompress()
+
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.image_variants, {})
+        for name in variants:
+            self.assertFalse(self.post.image.storage.exists(name))
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ActivityRollupTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='StrongPassword123!'
+        )
+        counters._local.clear()
+        self.addCleanup(counters._local.clear)
+        self.games = [
+            Game.objects.create(title=f'Game {index}', description='desc', creator=self.user) for index in range(3)
+        ]
+
+    def test_flushed_counts_are_rolled_up_per_day(self):
+        first, second, third = self.games
+        for game in (first, second, second, third):
+            increment(Game, game.pk)
+        increment(Game, first.pk, 'play_count')
+        flush_counters()
+        increment(Game, second.pk)
+        flush_counters()
+
+        today = timezone.now().date()
+        record_events(Game, ActivityRollup.DOWNLOAD, {first.pk: 5}, day=today - timedelta(days=3))
+
+        self.assertEqual(ActivityRollup.objects.filter(object_id=second.pk).get().count, 3)
+        self.assertEqual(time_series(second, ActivityRollup.PLAY, days=2), [(today - timedelta(days=1), 0), (today, 0)])
+        self.assertEqual(time_series(first, ActivityRollup.PLAY, days=1), [(today, 1)])
+        self.assertEqual(
+            [count for day, count in time_series(first, ActivityRollup.DOWNLOAD, days=4)], [5, 0, 0, 1]
+        )
+        self.assertEqual(top(Game, ActivityRollup.DOWNLOAD, days=1, limit=2), [(second.pk, 3), (first.pk, 1)])
+        self.assertEqual(top(Game, ActivityRollup.DOWNLOAD, days=7)[0], (first.pk, 6))
+
+    def test_counts_written_through_without_redis_are_rolled_up(self):
+        redis = mock.Mock()
+        redis.pipeline.side_effect = ConnectionError('Redis is down')
+
+        with mock.patch('afkat.utils.counters._redis', return_value=redis):
+            increment(Game, self.games[0].pk)
+
+        self.games[0].refresh_from_db()
+        self.assertEqual(self.games[0].download_count, 1)
+        self.assertEqual(time_series(self.games[0], ActivityRollup.DOWNLOAD, days=1)[0][1], 1)
+
+    def test_stats_and_trending_endpoints(self):
+        record_events(Game, ActivityRollup.DOWNLOAD, {self.games[1].pk: 2, self.games[2].pk: 7})
+        client = APIClient()
+
+        stats = client.get(reverse('afkat_game_api:game-stats', kwargs={'pk': self.games[1].pk}), {'days': 3})
+        trending = client.get(reverse('afkat_game_api:game-trending'), {'event': 'download', 'limit': 1})
+        invalid = client.get(reverse('afkat_game_api:game-trending'), {'event': 'rating'})
+
+        self.assertEqual(stats.status_code, status.HTTP_200_OK)
+        self.assertEqual([point['count'] for point in stats.data['series']], [0, 0, 2])
+        self.assertEqual(stats.data['total'], 2)
+        self.assertEqual(trending.status_code, status.HTTP_200_OK)
+        self.assertEqual([(game['id'], game['window_count']) for game in trending.data['results']], [(self.games[2].pk, 7)])
+        self.assertEqual(invalid.status_code, status.HTTP_400_BAD_REQUEST)